@@ -1,6 +1,7 @@
 #include <algorithm>
 #include <cassert>
 #include <chrono>
+#include <cstdio>
 #include <ctime>
 #include <exception>
 #include <fstream>
@@ -15,6 +16,9 @@
 #include <vector>
 using namespace std;
 
+// define LTF_NO_IMPLEMENTATION before including to get the declarations only,
+// for translation units linked against another one that has the definitions
+
 namespace LTF
 {
     template <class T>
@@ -97,6 +101,7 @@ namespace LTF
     };
 };
 
+#ifndef LTF_NO_IMPLEMENTATION
 LTF::TestCase::TestCase()
 {
     this->m_function = nullptr;
@@ -130,6 +135,7 @@ LTF::LTFStatus LTF::TestCase::run(bool debug, double& time)
     time = elapsed.count();
     return this->m_function(debug);
 }
+#endif
 
 namespace LTF
 {
@@ -157,6 +163,7 @@ namespace LTF
         // getters
         inline const std::string& get_suite_name() const { return this->m_suite_name; }
         inline std::size_t get_num_tests() const { return this->m_test_cases.size(); }
+        inline const std::map<std::string, TestCase>& get_test_cases() const { return this->m_test_cases; }
 
         // print all of the cases's name
         void print() const
@@ -175,6 +182,7 @@ namespace LTF
 
 };
 
+#ifndef LTF_NO_IMPLEMENTATION
 LTF::TestSuite::TestSuite()
 {
 }
@@ -220,6 +228,7 @@ std::map<std::string, LTF::LTFStatus>& LTF::TestSuite::run_all(bool debug, int&
     test_count = this->m_passed_flags.size();
     return this->m_passed_flags;
 }
+#endif
 
 namespace LTF
 {
@@ -227,6 +236,8 @@ namespace LTF
     {
         CONSOLE = 0,
         FILE = 1,
+        // one JSON object per test on stdout, for machines instead of people
+        JSON = 2,
     };
 
     // implement Singleton design pattern
@@ -249,6 +260,38 @@ namespace LTF
             if (mode == LTF::MODE::CONSOLE) std::cout << message;
         }
 
+        // push out what was written so far, so readers see each test as it finishes
+        inline static void flush(std::ofstream& outs, LTF::MODE mode = LTF::MODE::CONSOLE)
+        {
+            if (mode == LTF::MODE::FILE) outs.flush();
+            if (mode == LTF::MODE::CONSOLE) std::cout.flush();
+        }
+
+        // quote and escape text as a JSON string
+        inline static std::string json_string(const std::string& text)
+        {
+            std::string quoted = "\"";
+            for (char c : text)
+            {
+                if (c == '"' || c == '\\')
+                {
+                    quoted += '\\';
+                    quoted += c;
+                }
+                else if (static_cast<unsigned char>(c) < 0x20)
+                {
+                    char escaped[7];
+                    std::snprintf(escaped, sizeof(escaped), "\\u%04x", c);
+                    quoted += escaped;
+                }
+                else quoted += c;
+            }
+            return quoted + "\"";
+        }
+
+        // JSON mode of run_all, each test's record is written as soon as it finishes
+        void run_json(bool debug);
+
     private:
         // CTORS
         LittleTestFramework();
@@ -290,6 +333,7 @@ namespace LTF
     };
 };
 
+#ifndef LTF_NO_IMPLEMENTATION
 LTF::LittleTestFramework::LittleTestFramework()
 {
     this->m_suites = std::map<std::string, LTF::TestSuite>();
@@ -335,6 +379,12 @@ void LTF::LittleTestFramework::ignore_tests(const std::string& suite_name, const
 
 void LTF::LittleTestFramework::run_all(bool debug, MODE mode, const std::string& path)
 {
+    if (mode == LTF::MODE::JSON)
+    {
+        this->run_json(debug);
+        return;
+    }
+
     std::ofstream outs;
     if (mode == LTF::MODE::FILE) outs.open(path);
 
@@ -373,15 +423,18 @@ void LTF::LittleTestFramework::run_all(bool debug, MODE mode, const std::string&
         LTF::LittleTestFramework::output(SPACE + "RUNNING " + std::to_string(tests_count[i]) + " TEST" + (tests_count[i] != 1 ? "S" : "") + " FROM " + suite.first + "\n", outs, mode);
         LTF::LittleTestFramework::output(LINE + "\n", outs, mode);
 
-        // run all and get the tests and times
-        int num_test = 0;
+        // tests are run one at a time and reported right away instead of after the whole suite
         std::map<std::string, double> times;
-        auto pass_map = suite.second.run_all(debug, num_test, times);
 
         // success and fail count
         int count = 1, success_count = 0, fail_count = 0;
-        for (const auto& flag : pass_map)
+        for (const auto& test : suite.second.get_test_cases())
         {
+            TestCase test_case = test.second;
+            double time = 0;
+            std::pair<std::string, LTF::LTFStatus> flag(test.first, test_case.run(debug, time));
+            times[flag.first] = time;
+
             LTF::LittleTestFramework::output(SPACE + "RUNNING...\n", outs, mode);
             std::string result = SPACE + SPACE + std::to_string(count) + ".TEST NAME:" + flag.first + " ----> ";
 
@@ -439,6 +492,7 @@ void LTF::LittleTestFramework::run_all(bool debug, MODE mode, const std::string&
                 std::string output_str = "\n" + SPACE + SPACE + std::string("MESSAGE") + (messages.size() != 1 ? "S" : "") + std::string(" FROM:") + flag.first + ":\n" + messages_output;
                 LTF::LittleTestFramework::output(output_str, outs, mode);
             }
+            LTF::LittleTestFramework::flush(outs, mode);
             ++count;
         }
 
@@ -468,6 +522,42 @@ void LTF::LittleTestFramework::run_all(bool debug, MODE mode, const std::string&
     if (mode == LTF::MODE::FILE) outs.close();
 }
 
+void LTF::LittleTestFramework::run_json(bool debug)
+{
+    for (auto& suite : this->m_suites)
+    {
+        for (const auto& test : suite.second.get_test_cases())
+        {
+            const std::string& name = test.first;
+            TestCase test_case = test.second;
+            double time = 0;
+            LTF::LTFStatus status = test_case.run(debug, time);
+
+            // same rules as the console output, a test over its time limit fails
+            bool success = status.code == LTF::SUCCESS;
+            std::vector<std::string> messages;
+            if (this->m_times.count(name) > 0 && this->m_times[name] <= time)
+            {
+                success = false;
+                messages.push_back("TIME LIMIT EXCEEDED: EXPECTED LESS THAN " + std::to_string(this->m_times[name]) + " NANOSECONDS");
+            }
+            if (this->m_messages.count(name) > 0)
+                for (const std::string& message : this->m_messages[name]) messages.push_back(message);
+
+            // the measured time is in milliseconds, the record starts a line of its
+            // own even when the test printed something without ending the line
+            std::ostringstream record;
+            record << "\n{\"suite\":" << json_string(suite.first) << ",\"name\":" << json_string(name);
+            record << ",\"status\":\"" << (success ? "SUCCESS" : "FAIL") << "\"";
+            record << ",\"ns\":" << static_cast<long long>(time * 1000000) << ",\"line\":" << status.line;
+            record << ",\"messages\":[";
+            for (std::size_t i = 0; i < messages.size(); ++i) record << (i > 0 ? "," : "") << json_string(messages[i]);
+            record << "]}\n";
+            std::cout << record.str() << std::flush;
+        }
+    }
+}
+
 void LTF::LittleTestFramework::comment(const std::string& function, const std::string& message)
 {
     // if the key exists, then get the vector
@@ -491,6 +581,7 @@ void LTF::LittleTestFramework::time(const std::string& function, double time_ns)
     // else add
     this->m_times[function] = time_ns;
 }
+#endif
 
 namespace LTF
 {
@@ -616,6 +707,7 @@ namespace LTF
     };
 };
 
+#ifndef LTF_NO_IMPLEMENTATION
 LTF::Logger::~Logger()
 {
     if (!this->m_file.is_open()) return;
@@ -725,6 +817,7 @@ void LTF::Logger::open(const std::string& path)
 void LTF::Logger::rotate_log_file()
 {
 }
+#endif
 
 namespace LTF
 {
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.utils.html import format_html
 from .models import Problem, TestCase, TestSuite, Submission
 
 
@@ -17,6 +18,18 @@ class TestSuiteAdmin(admin.ModelAdmin):
     inlines = [TestCaseInline]
 
 
+class SubmissionAdmin(admin.ModelAdmin):
+    list_display = ["id", "user", "problem", "language", "status", "success", "date"]
+    list_select_related = ["user", "problem"]
+    # a select of the blob would load every CodeBlob, the code is shown instead
+    raw_id_fields = ("blob",)
+    readonly_fields = ("code",)
+
+    @admin.display(description="Code")
+    def code(self, submission):
+        return format_html("<pre>{}</pre>", submission.code or "")
+
+
 admin.site.register(TestSuite, TestSuiteAdmin)
 admin.site.register(Problem)
-admin.site.register(Submission)
\ No newline at end of file
+admin.site.register(Submission, SubmissionAdmin)
\ No newline at end of file
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class LinnncodeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'linnncode'
+
+    def ready(self):
+        # keep test suite versions in step with their test cases
+        from . import signals  # noqa: F401
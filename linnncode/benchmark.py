@@ -0,0 +1,231 @@
+import math
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+from .driver import TestBuilder, TestDriver
+from .judge import judge
+from .models import Problem, Submission, TestCase, TestSuite
+
+
+# synthetic load for the judge, shared by the benchmark_judge command and the tests
+
+BENCHMARK_TEST = (
+    "LTF::LTFStatus test{n}(bool debug) {{ "
+    "if (add({n}, 1) == {n} + 1) return LTF::LTFStatus(LTF::SUCCESS, __LINE__); "
+    "return LTF::LTFStatus(LTF::FAIL, __LINE__); }}"
+)
+
+# a submission of each kind, the nonce keeps the binary cache from answering
+BENCHMARK_CODE = {
+    "pass": "int add(int a, int b) {{ return a + b; }} // {nonce}\n",
+    "fail": "int add(int a, int b) {{ return a - b; }} // {nonce}\n",
+    "compile": "int add(int a, int b) {{ return a + b }} // {nonce}\n",
+    "timeout": (
+        "int add(int a, int b) {{ volatile int x = 0; while (true) x++; "
+        "return a + b; }} // {nonce}\n"
+    ),
+}
+
+# share of each kind in a run, in percent
+BENCHMARK_MIX = {"pass": 50, "fail": 30, "compile": 15, "timeout": 5}
+
+
+def seed_problems(sizes: Sequence[int]) -> List[Problem]:
+    # one problem per suite size, its tests only pass for a correct add
+    problems = []
+    for size in sizes:
+        suite = TestSuite.objects.create(title=f"Benchmark {size}")
+        TestCase.objects.bulk_create(
+            TestCase(
+                title=f"test{n}",
+                test_case=BENCHMARK_TEST.format(n=n),
+                test_suite=suite,
+            )
+            for n in range(1, size + 1)
+        )
+        # bulk_create doesn't send the signals that keep it up to date
+        suite.refresh_content_hash()
+        problems.append(
+            Problem.objects.create(
+                title=f"Benchmark {size} tests",
+                description="Return the sum of a and b.",
+                prewritten_code="int add(int a, int b) {}",
+                test_suite=suite,
+            )
+        )
+    return problems
+
+
+def submission_code(kind: str, unique: bool = True) -> str:
+    return BENCHMARK_CODE[kind].format(nonce=uuid.uuid4().hex if unique else "")
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    # "pass=50,fail=30" style, kinds that are left out are not sent
+    mix = {}
+    for part in value.split(","):
+        kind, _, share = part.partition("=")
+        if kind.strip() not in BENCHMARK_CODE:
+            raise ValueError(f"unknown submission kind {kind.strip()!r}")
+        mix[kind.strip()] = int(share)
+    return mix
+
+
+def plan(
+    problems: Sequence[Problem],
+    count: int,
+    mix: Optional[Dict[str, int]] = None,
+    seed: Optional[int] = None,
+) -> List[Tuple[Problem, str]]:
+    mix = mix or BENCHMARK_MIX
+    rng = random.Random(seed)
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=count)
+    return [(rng.choice(problems), kind) for kind in kinds]
+
+
+# what a verdict counts as, the same names as the kinds of submissions
+def outcome(success: bool, error: Optional[str]) -> str:
+    if error == "Compilation Error":
+        return "compile"
+    if error in ("Execution Timeout", "CPU Time Limit Exceeded"):
+        return "timeout"
+    if error:
+        return "error"
+    return "pass" if success else "fail"
+
+
+def judge_with_driver(problem: Problem, code: str) -> Dict:
+    # the judge without the database, straight through TestDriver
+    start = time.perf_counter()
+    tests, count = TestBuilder.get_tests(problem.test_suite, "cpp")
+    builder = TestBuilder("cpp")
+    builder.setup_cpp(tests, code, count)
+    driver = TestDriver(builder.build(), builder.harness())
+    output, error = driver.execute_cpp()
+    success = False
+    if not error:
+        records = TestDriver.extract_cpp_records(output)
+        # like grade, a test without a record did not pass
+        success = len(records) == count and all(
+            record["status"] != "FAIL" for record in records.values()
+        )
+    return {
+        "latency": time.perf_counter() - start,
+        **driver.timings(),
+        "outcome": outcome(success, error),
+    }
+
+
+def judge_with_view(client: Client, problem: Problem, code: str) -> Dict:
+    # a POST to problem_detail_view, then judged here the way a worker would
+    start = time.perf_counter()
+    response = client.post(
+        reverse("problem_detail", args=[problem.id]),
+        {"code": code, "language": "cpp"},
+    )
+    if response.status_code != 302:
+        return {
+            "latency": time.perf_counter() - start,
+            "compile": 0.0,
+            "run": 0.0,
+            "outcome": "busy" if response.status_code == 503 else "error",
+        }
+    pk = int(response.url.rpartition("=")[2])
+    Submission.objects.filter(pk=pk, status=Submission.PENDING).update(
+        status=Submission.RUNNING
+    )
+    submission = judge(
+        Submission.objects.select_related("problem__test_suite", "blob").get(pk=pk)
+    )
+    timings = getattr(submission, "timings", {"compile": 0.0, "run": 0.0})
+    return {
+        "latency": time.perf_counter() - start,
+        **timings,
+        "outcome": outcome(submission.success, submission.error),
+    }
+
+
+def run_load(
+    work: Sequence[Tuple[Problem, str]],
+    via: str = "driver",
+    concurrency: int = 1,
+    user: Optional[User] = None,
+    unique: bool = True,
+) -> Tuple[List[Dict], float]:
+    # judges every (problem, kind) with that many submissions in flight,
+    # returns one sample per submission and the wall time of the whole run
+    pending = queue.Queue()
+    for problem, kind in work:
+        pending.put((problem, kind, submission_code(kind, unique)))
+    samples = []
+    lock = threading.Lock()
+
+    def worker() -> None:
+        client = None
+        if via == "view":
+            client = Client()
+            client.force_login(user)
+        try:
+            while True:
+                try:
+                    problem, kind, code = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    if via == "view":
+                        sample = judge_with_view(client, problem, code)
+                    else:
+                        sample = judge_with_driver(problem, code)
+                except Exception as e:
+                    sample = {
+                        "latency": 0.0,
+                        "compile": 0.0,
+                        "run": 0.0,
+                        "outcome": "error",
+                        "exception": str(e),
+                    }
+                sample["kind"] = kind
+                sample["suite"] = problem.test_suite.title
+                with lock:
+                    samples.append(sample)
+        finally:
+            connections.close_all()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+# nearest rank percentile, 0 for no values
+def percentile(values: Sequence[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def summarize(samples: Sequence[Dict], wall: float) -> Dict:
+    summary = {
+        "submissions": len(samples),
+        "wall": wall,
+        "throughput": len(samples) / wall if wall else 0.0,
+        "outcomes": Counter(sample["outcome"] for sample in samples),
+        # submissions whose verdict was not the one their kind should get
+        "mismatches": sum(sample["outcome"] != sample["kind"] for sample in samples),
+    }
+    for stage in ("latency", "compile", "run"):
+        values = [sample[stage] for sample in samples]
+        summary[stage] = {p: percentile(values, p) for p in (50, 95, 99)}
+    return summary
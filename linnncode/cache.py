@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no flock, identical runs are only coalesced within a process
+    fcntl = None
+
+
+# on disk cache of compiled binaries and their run results, keyed by what was
+# compiled so every worker process on the host shares it and it survives restarts
+class BinaryCache:
+    # an eviction lock older than this belongs to a crashed worker
+    STALE_LOCK_SECONDS = 60
+
+    def __init__(self, root: str, max_bytes: int) -> None:
+        self._root = root
+        self._max_bytes = max_bytes
+        # key vs [lock, number of threads using it], for threads of one process
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    @staticmethod
+    def key(*parts: str) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self._root, key[:2], key + suffix)
+
+    def _touch(self, path: str) -> bool:
+        # bump the mtime so eviction sees the entry as recently used
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _write(self, path: str, write) -> None:
+        # write under a private name then rename, readers only ever see whole files
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = f"{path}.{os.getpid()}.tmp"
+        try:
+            write(temp)
+            os.replace(temp, path)
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
+
+    def get_result(
+        self, key: str
+    ) -> Optional[Tuple[Optional[str], str, Optional[Dict]]]:
+        path = self._path(key, ".json")
+        try:
+            with open(path, "r") as file:
+                result = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+        self._touch(path)
+        return result["output"], result["error"], result.get("usage")
+
+    def put_result(
+        self,
+        key: str,
+        output: Optional[str],
+        error: str,
+        usage: Optional[Dict] = None,
+    ) -> None:
+        def write(temp):
+            with open(temp, "w") as file:
+                json.dump({"output": output, "error": error, "usage": usage}, file)
+
+        self._write(self._path(key, ".json"), write)
+        self.evict()
+
+    def get_binary(self, key: str) -> Optional[str]:
+        path = self._path(key, ".exe")
+        if not self._touch(path):
+            return None
+        return path
+
+    def put_binary(self, key: str, exe_file: str) -> str:
+        path = self._path(key, ".exe")
+        self._write(path, lambda temp: shutil.copy2(exe_file, temp))
+        self.evict()
+        return path
+
+    @contextmanager
+    def _thread_lock(self, key: str):
+        with self._locks_lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._locks_lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+    @contextmanager
+    def lock(self, key: str):
+        # held while a key is built and run, so identical work that starts at the
+        # same time in any thread or worker process waits for the first one instead
+        with self._thread_lock(key):
+            if fcntl is None:
+                yield
+                return
+            path = self._path(key, ".lock")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            while True:
+                fd = os.open(path, os.O_CREAT | os.O_RDWR)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                # the previous holder removes the file on release, only a lock on
+                # the file still at the path counts
+                try:
+                    if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                        break
+                except FileNotFoundError:
+                    pass
+                os.close(fd)
+            try:
+                yield
+            finally:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                os.close(fd)
+
+    def evict(self) -> None:
+        # only one process evicts at a time, the others just skip it
+        os.makedirs(self._root, exist_ok=True)
+        lock = os.path.join(self._root, "evict.lock")
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock) > self.STALE_LOCK_SECONDS:
+                    os.remove(lock)
+            except FileNotFoundError:
+                pass
+            return
+        try:
+            entries = []
+            total = 0
+            for directory in os.scandir(self._root):
+                if not directory.is_dir():
+                    continue
+                for entry in os.scandir(directory.path):
+                    if entry.name.endswith((".tmp", ".lock")):
+                        continue
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            if total <= self._max_bytes:
+                return
+            # least recently used first, trim to 90% so we don't evict on every write
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self._max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+        finally:
+            os.close(fd)
+            os.remove(lock)
@@ -1,9 +1,127 @@
-# Maximum size of the cache (adjust as needed)
-MAX_CACHE_SIZE = 100
+import os
+import tempfile
 
 # Timeout for the subprocess execution (in seconds)
 EXECUTION_TIMEOUT = 5
 
+# Resource limits of a test binary, CPU time (in seconds), address space and
+# output size (in bytes)
+CPU_TIME_LIMIT = EXECUTION_TIMEOUT
+MEMORY_LIMIT = 512 * 1024 * 1024
+OUTPUT_LIMIT = 16 * 1024 * 1024
+
+# Most of a test binary's stderr kept (in bytes), the rest is read and dropped
+ERROR_OUTPUT_LIMIT = 64 * 1024
+
+# Longest a g++ run may take (in seconds), a compile past it is a judge error
+COMPILE_TIMEOUT = 30
+
+# Judge submissions in separate worker processes (python manage.py judge)
+# instead of inside the request, turn off to judge inline without a worker
+JUDGE_ASYNC = True
+
+# Number of judge worker processes started by the judge command
+JUDGE_WORKERS = os.cpu_count() or 1
+
+# Most compilers and test binaries running at once on the host, across the judge
+# workers, web workers and management commands
+COMPILE_SLOTS = max(1, (os.cpu_count() or 1) // 2)
+RUN_SLOTS = os.cpu_count() or 1
+
+# Most submissions waiting for the judge, new ones are turned away beyond this
+JUDGE_MAX_QUEUE = 100
+
+# Longest a judge run waits for a free compile/run slot (in seconds)
+JUDGE_SLOT_TIMEOUT = 30
+
+# How often a judge run waiting for a slot checks for a free one (in seconds)
+JUDGE_SLOT_POLL_INTERVAL = 0.02
+
+# Rough time to judge one submission, used to tell users when to retry (in seconds)
+JUDGE_ESTIMATE_SECONDS = 2
+
+# Python interpreters each judge process keeps started and waiting
+PYTHON_POOL_SIZE = 2
+
+# How long an idle judge worker sleeps before looking for work again (in seconds)
+JUDGE_POLL_INTERVAL = 0.2
+
+# How often the problem page polls a pending submission (in milliseconds)
+STATUS_POLL_INTERVAL = 500
+
+# Least time between two writes of a submission's verdicts so far while it is
+# judged (in seconds), the final verdict is always written
+PUBLISH_INTERVAL = 0.25
+
+# How often a submission's event stream checks for new verdicts (in seconds),
+# checking more often than the judge writes them only reads the same row again
+STREAM_POLL_INTERVAL = PUBLISH_INTERVAL
+
+# Longest a submission's event stream stays open (in seconds), after that the
+# page falls back to polling so a stuck submission doesn't hold a connection
+STREAM_MAX_SECONDS = 60
+
+# Cache key of the problem list generation, bumped whenever a problem changes,
+# and how long a cached page of the list is kept, which is also how far behind
+# the statistics on its cards may be (in seconds)
+PROBLEM_LIST_GENERATION = "linnncode:problems:generation"
+PROBLEM_LIST_CACHE_SECONDS = 5 * 60
+
+# Most problems a search returns, ranked best first
+SEARCH_MAX_RESULTS = 1000
+
+# How long the submission total shown on history pages may be out of date
+# (in seconds), None leaves the total out
+SUBMISSION_TOTAL_CACHE_SECONDS = 5 * 60
+
+# Users per leaderboard page, and how long pages and ranks are cached (in seconds)
+LEADERBOARD_PAGE_SIZE = 25
+LEADERBOARD_CACHE_SECONDS = 60
+
+# Compiler and flags, shared by the precompiled header and every submission
+# (a .gch is only used when the flags match the ones it was built with)
+CPP_COMPILER = "g++"
+CPP_FLAGS = ["-std=gnu++17"]
+
+# Directory for judge artifacts that outlive a single run (precompiled header,
+# compiled binaries), shared by every worker process on the host
+JUDGE_DIR = os.path.join(tempfile.gettempdir(), "linnncode")
+
+# Directory of the reusable build workspaces, in memory when the host has a tmpfs
+WORKSPACE_DIR = (
+    os.path.join("/dev/shm", "linnncode")
+    if os.path.isdir("/dev/shm")
+    else os.path.join(JUDGE_DIR, "workspaces")
+)
+
+# Size budget of the on-disk binary cache, least recently used entries go first
+BINARY_CACHE_BYTES = 512 * 1024 * 1024
+
+# Submissions the rejudge command writes back per database update, and where it
+# keeps its progress so an interrupted rejudge picks up where it stopped
+REJUDGE_BATCH_SIZE = 500
+REJUDGE_CHECKPOINT = os.path.join(JUDGE_DIR, "rejudge.json")
+
+# Where each judging process keeps its metrics for /metrics to add up, and the
+# upper bounds in seconds of the judge's timing histograms
+METRICS_DIR = os.path.join(JUDGE_DIR, "metrics")
+METRICS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Lock files of the compile and run slots, shared by every judging process
+JUDGE_SLOT_DIR = os.path.join(JUDGE_DIR, "slots")
+
+# Request profiling (middleware.ProfilingMiddleware), a request is profiled when
+# it sends "X-Profile: <PROFILE_TOKEN>", when a staff user adds ?profile=1, or
+# for a PROFILE_SAMPLE_RATE share of all requests. Full cProfile dumps go to
+# PROFILE_DIR, only the newest PROFILE_KEEP are kept
+PROFILE_TOKEN = os.environ.get("LINNNCODE_PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.environ.get("LINNNCODE_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.path.join(JUDGE_DIR, "profiles")
+PROFILE_KEEP = 1000
+
+# Name of the header holding LTF + definitions, precompiled next to itself
+PRELUDE_HEADER = "ltf_prelude.h"
+
 TREE_NODE_DEF = """
 
 struct Node {
@@ -25,7 +143,7 @@ const bool debug = false;
 
 int main()
 {
-    LTF::LTF_RUN_ALL(debug, LTF::MODE::CONSOLE);
+    LTF::LTF_RUN_ALL(debug, LTF::MODE::JSON);
     return 0;
 }
 
@@ -1,26 +1,110 @@
-from typing import List, Dict
-from .utils import run_cpp, match_cpp_output, build_registration
+from typing import Callable, Dict, Optional, Tuple
+from .utils import (
+    run_cpp,
+    match_cpp_output,
+    match_cpp_records,
+    parse_cpp_record,
+    build_registration,
+    build_pch,
+    build_harness,
+)
 import os
+import json
+import hashlib
+import threading
+import time
+from django.core.cache import cache
+from .limiter import JudgeBusy, judge_limiter
+from .metrics import judge_metrics
+from .pool import InterpreterPool
 from .constants import CPP_MAIN, TREE_NODE_DEF
 
 
-# will get the base code and build the test cases with user's code into 1 single file
+# will get the base code and build the test cases with user's code into 1 single file,
+# linked against a prebuilt harness with LTF, the registrations and main when possible
 class TestBuilder:
     LTF = None
+    LTF_MTIME = None
+    # hash of LTF.h, part of every compiled binary's cache key
+    LTF_VERSION = ""
+    # registration count vs prebuilt harness object
+    HARNESSES = {}
+    # what every translation unit starts with, either an include of the
+    # precompiled LTF header or the LTF source itself as a fallback
+    PRELUDE = None
+    # (suite content hash, language) vs (test source, test count)
+    SUITES = {}
+    _lock = threading.Lock()
+    _harness_lock = threading.Lock()
 
     @classmethod
     def init_LTF(cls) -> None:
-        if cls.LTF is not None:
-            return
         current_file = os.path.abspath(__file__)
         ltf_file = os.path.join(os.path.dirname(current_file), "LTF", "LTF.h")
-        with open(ltf_file, "r") as ltf_file:
-            cls.LTF = ltf_file.read()
+        # only reload (and rebuild the precompiled header) when LTF.h changes
+        mtime = os.path.getmtime(ltf_file)
+        if cls.LTF is not None and cls.LTF_MTIME == mtime:
+            return
+        with cls._lock:
+            if cls.LTF is not None and cls.LTF_MTIME == mtime:
+                return
+            with open(ltf_file, "r") as file:
+                ltf = file.read()
+            # LTF's definitions live in the harness, the user's unit only declares them
+            prelude = "#define LTF_NO_IMPLEMENTATION\n" + ltf + "\n" + TREE_NODE_DEF + "\n"
+            header = build_pch(prelude)
+            if header is not None:
+                prelude = '#include "' + header.replace("\\", "/") + '"\n'
+            cls.PRELUDE = prelude
+            cls.LTF = ltf
+            cls.LTF_MTIME = mtime
+            cls.LTF_VERSION = hashlib.sha256(ltf.encode()).hexdigest()
+            cls.HARNESSES = {}
+
+    @classmethod
+    def get_harness(cls, registration_count: int) -> Optional[str]:
+        harness = cls.HARNESSES.get(registration_count)
+        if harness is not None:
+            return harness
+        with cls._harness_lock:
+            harness = cls.HARNESSES.get(registration_count)
+            if harness is None:
+                harness = build_harness(cls.LTF, registration_count)
+            # a failed build is tried again next time, it may have been transient
+            if harness is not None:
+                cls.HARNESSES[registration_count] = harness
+        return harness
+
+    @classmethod
+    def get_tests(cls, suite, language: str) -> Tuple[str, int]:
+        # the suite's test cases in one string and how many there are, rebuilt only
+        # when the suite's content changes, and shared across processes via the cache
+        content_hash = suite.content_hash or suite.refresh_content_hash()
+        memo = cls.SUITES.get((content_hash, language))
+        if memo is not None:
+            judge_metrics.count("linnncode_judge_cache_total", cache="suite", result="hit")
+            return memo
+        key = f"linnncode:suite:{content_hash}:{language}"
+        tests = cache.get(key)
+        judge_metrics.count(
+            "linnncode_judge_cache_total",
+            cache="suite",
+            result="miss" if tests is None else "hit",
+        )
+        if tests is None:
+            cases = suite.test_cases.filter(language=language).order_by("id")
+            cases = list(cases.values_list("test_case", flat=True))
+            tests = ("".join("\n" + case + "\n" for case in cases), len(cases))
+            # keyed by content, an entry never goes stale
+            cache.set(key, tests, None)
+        cls.SUITES[(content_hash, language)] = tests
+        return tests
 
     def __init__(self, language: str) -> None:
         TestBuilder.init_LTF()
         self._language = language
         self._exe = None
+        self._harness = None
 
     def build(self) -> str:
         if self._exe is None:
@@ -30,42 +114,97 @@ class TestBuilder:
     def language(self) -> str:
         return self._language
 
-    def setup_cpp(self, tests: List[str], code: str, registration_count: int):
-        # LTF
-        exe = TestBuilder.LTF + "\n"
-        # definitions
-        exe += TREE_NODE_DEF + "\n"
+    def harness(self) -> Optional[str]:
+        return self._harness
+
+    def setup_cpp(self, tests: str, code: str, registration_count: int):
+        harness = TestBuilder.get_harness(registration_count)
+        if harness is not None:
+            # LTF and definitions, must come first for the precompiled header to be used
+            exe = TestBuilder.PRELUDE
+        else:
+            # no prebuilt harness, fall back to one self contained file
+            exe = TestBuilder.LTF + "\n" + TREE_NODE_DEF + "\n"
         # code
         exe += code + "\n"
         # Test case
-        for test in tests:
-            exe += "\n" + test + "\n"
-        # registrations
-        exe += build_registration(registration_count) + "\n"
-        # main
-        exe += CPP_MAIN + "\n"
+        exe += tests
+        if harness is None:
+            # registrations
+            exe += build_registration(registration_count) + "\n"
+            # main
+            exe += CPP_MAIN + "\n"
         # assign
         self._exe = exe
+        self._harness = harness
 
-    def setup_python(self) -> str:
-        pass
+    def setup_python(self, tests: str, code: str):
+        # code then the test functions, run as one module by the Python harness
+        self._exe = code + "\n" + tests
 
 
-# will take the TestBuilder's 1 single file and execute them
+# will take the TestBuilder's 1 single file (and its harness) and execute them
 class TestDriver:
     @classmethod
     def extract_cpp_output(cls, input_str) -> Dict:
         return match_cpp_output(input_str)
 
-    def __init__(self, exe) -> None:
+    @classmethod
+    def extract_cpp_records(cls, input_str) -> Dict:
+        return match_cpp_records(input_str)
+
+    def __init__(self, exe, harness: Optional[str] = None) -> None:
         self._exe = exe
+        self._harness = harness
+        self._usage = None
+        self._timings = {"compile": 0.0, "run": 0.0}
+
+    # CPU time and peak memory of the last run, None when it didn't run
+    def usage(self) -> Optional[Dict]:
+        return self._usage
+
+    # wall seconds the last run spent compiling and running
+    def timings(self) -> Dict[str, float]:
+        return self._timings
+
+    def execute_cpp(self, on_result: Optional[Callable[[Dict], None]] = None):
+        # hand each test's record to on_result as soon as it is printed
+        def on_line(line: str) -> None:
+            record = parse_cpp_record(line)
+            if record is not None:
+                on_result(record)
 
-    def execute_cpp(self):
+        listener = on_line if on_result is not None else None
         try:
-            output, error = run_cpp(self._exe)
+            output, error, self._usage = run_cpp(
+                self._exe,
+                TestBuilder.LTF_VERSION,
+                self._harness,
+                listener,
+                self._timings,
+            )
             return output, error
+        except JudgeBusy:
+            # not a verdict, the submission is judged again later
+            raise
         except Exception as e:
             return "", str(e)
 
-    def execute_python(self):
-        pass
+    def execute_python(self, on_result: Optional[Callable[[Dict], None]] = None):
+        # runs in a pre-started interpreter, the records come back as LTF's JSON lines
+        try:
+            with judge_limiter.run_slot():
+                start = time.perf_counter()
+                records, error, self._usage = InterpreterPool.instance().run(
+                    self._exe, on_result
+                )
+                self._timings["run"] = time.perf_counter() - start
+                judge_metrics.observe("run", self._timings["run"])
+            if error:
+                return None, error
+            output = "".join(json.dumps(record) + "\n" for record in records)
+            return output, error
+        except JudgeBusy:
+            raise
+        except Exception as e:
+            return "", str(e)
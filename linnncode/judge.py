@@ -0,0 +1,224 @@
+import time
+from typing import Callable, Dict, Optional, Tuple
+from django.db import transaction
+from .models import Submission
+from .driver import TestBuilder, TestDriver
+from .limiter import JudgeBusy
+from .pool import InterpreterPool
+from .stats import record_verdict
+from .metrics import judge_metrics, outcome
+from .constants import JUDGE_POLL_INTERVAL, PUBLISH_INTERVAL
+
+
+# test name vs status, and test name vs the rest of its LTF record
+def split_records(records: Dict[str, Dict]) -> Tuple[Dict, Dict]:
+    results = {}
+    details = {}
+    for name, record in records.items():
+        results[name] = record["status"]
+        details[name] = {
+            "ns": record.get("ns"),
+            "line": record.get("line"),
+            "messages": record.get("messages", []),
+        }
+    return results, details
+
+
+# the submission fields a verdict is written to
+VERDICT_FIELDS = [
+    "results",
+    "details",
+    "error",
+    "success",
+    "cpu_time",
+    "memory",
+    "status",
+]
+
+
+# build, run and grade one submission, sets the verdict on it without saving,
+# publish gets each test record as soon as it has run
+def grade(
+    submission: Submission, publish: Optional[Callable[[Dict], None]] = None
+) -> Submission:
+    problem = submission.problem
+    output = None
+    err = None
+    results = None
+    details = None
+    usage = None
+    flag = False
+
+    # build the test output based on laguage
+    test_builder = TestBuilder(submission.language)
+    test_exe = None
+    # the test cases written for this language, assembled once per suite version
+    tests, count = TestBuilder.get_tests(problem.test_suite, submission.language)
+
+    records = {}
+
+    def on_result(record: Dict) -> None:
+        records[record["name"]] = record
+        if publish is not None:
+            publish(record)
+
+    if submission.language == "cpp":
+        # pass in list of tests and main, and code, and registration
+        with judge_metrics.timer("setup"):
+            test_builder.setup_cpp(tests, submission.code, count)
+        # build the file and put it into driver
+        test_exe = TestDriver(test_builder.build(), test_builder.harness())
+        output, err = test_exe.execute_cpp(on_result)
+    elif submission.language == "python":
+        with judge_metrics.timer("setup"):
+            test_builder.setup_python(tests, submission.code)
+        test_exe = TestDriver(test_builder.build())
+        output, err = test_exe.execute_python(on_result)
+    else:
+        err = "Unsupported Language"
+
+    if test_exe is not None:
+        usage = test_exe.usage()
+        # not a field, how long the build and the run took for whoever judged it
+        submission.timings = test_exe.timings()
+    # handling output, on error keep the tests that finished before it went wrong
+    if not err:
+        with judge_metrics.timer("parse"):
+            records = TestDriver.extract_cpp_records(output)
+    if records or not err:
+        # decide which one is correct which one is wrong
+        results, details = split_records(records)
+    # a test without a record did not pass, e.g. the run stopped before it
+    if not err and len(records) < count:
+        err = "Missing Test Results"
+    # no error and no fail, then success
+    if not err and "FAIL" not in results.values():
+        flag = True
+
+    submission.results = results
+    submission.details = details
+    submission.error = err or None
+    submission.success = flag
+    submission.cpu_time = (usage or {}).get("cpu_time")
+    submission.memory = (usage or {}).get("memory")
+    submission.status = Submission.DONE
+    judge_metrics.count(
+        "linnncode_judge_submissions_total",
+        language=submission.language,
+        outcome=outcome(flag, submission.error),
+    )
+    return submission
+
+
+# sets the verdict of a submission the judge failed on, without saving it
+def judge_error(submission: Submission, e: Exception) -> None:
+    submission.results = None
+    submission.details = None
+    submission.error = f"Judge Error: {e}"
+    submission.success = False
+    submission.cpu_time = None
+    submission.memory = None
+    submission.status = Submission.DONE
+    judge_metrics.count(
+        "linnncode_judge_submissions_total",
+        language=submission.language,
+        outcome="judge_error",
+    )
+
+
+# grade a submission and write the verdict back to it
+def judge(submission: Submission) -> Submission:
+    # a submission judged before is being rejudged, its totals only change by
+    # the difference in verdict
+    first = submission.status != Submission.DONE
+    was_success = bool(submission.success) and not first
+    streamed = {}
+    # nothing is written before the first interval is up, so a result replayed
+    # from the cache only gets its final write
+    published_at = time.monotonic()
+
+    # publish the verdicts so far, so the page can stream them, at most once per
+    # PUBLISH_INTERVAL rather than rewriting all of them on every test
+    def publish(record: Dict) -> None:
+        nonlocal published_at
+        streamed[record["name"]] = record
+        now = time.monotonic()
+        if now - published_at < PUBLISH_INTERVAL:
+            return
+        published_at = now
+        results, details = split_records(streamed)
+        Submission.objects.filter(pk=submission.pk).update(
+            results=results, details=details
+        )
+
+    grade(submission, publish)
+    with judge_metrics.timer("save"), transaction.atomic():
+        submission.save(update_fields=VERDICT_FIELDS)
+        record_verdict(submission, first, was_success)
+    judge_metrics.flush()
+    return submission
+
+
+# grade a submission by id without saving it, the verdict comes back as field values,
+# or None when it was skipped
+def regrade(pk: int) -> Tuple[int, Optional[Dict]]:
+    submission = Submission.objects.select_related("problem__test_suite", "blob").get(pk=pk)
+    try:
+        grade(submission)
+    except JudgeBusy:
+        # no slot came free, the submission keeps the verdict it had
+        return pk, None
+    except Exception as e:
+        judge_error(submission, e)
+    judge_metrics.flush()
+    return pk, {field: getattr(submission, field) for field in VERDICT_FIELDS}
+
+
+# number of submissions waiting for a judge worker
+def queue_length() -> int:
+    return Submission.objects.filter(status=Submission.PENDING).count()
+
+
+# atomically take the oldest pending submission, None when the queue is empty
+def claim_next() -> Optional[Submission]:
+    pending = Submission.objects.filter(status=Submission.PENDING).order_by("id")
+    for pk in pending.values_list("id", flat=True)[:10]:
+        # only one worker can move a row out of pending, the others move on
+        claimed = Submission.objects.filter(pk=pk, status=Submission.PENDING).update(
+            status=Submission.RUNNING
+        )
+        if claimed:
+            return Submission.objects.select_related("problem__test_suite", "blob").get(pk=pk)
+    return None
+
+
+# judge worker main loop, runs until the process is stopped
+def work() -> None:
+    # start the Python interpreters before the first submission needs one
+    InterpreterPool.instance()
+    while True:
+        submission = claim_next()
+        if submission is None:
+            time.sleep(JUDGE_POLL_INTERVAL)
+            continue
+        try:
+            judge(submission)
+        except JudgeBusy:
+            # no slot came free, back in the queue for another try
+            Submission.objects.filter(pk=submission.pk).update(
+                status=Submission.PENDING
+            )
+            time.sleep(JUDGE_POLL_INTERVAL)
+        except Exception as e:
+            # never leave a submission stuck in running, and count the failed
+            # verdict like any other so the totals agree with rebuild_stats
+            judge_error(submission, e)
+            fields = {field: getattr(submission, field) for field in VERDICT_FIELDS}
+            with transaction.atomic():
+                # unless judge() got as far as saving its own verdict
+                running = Submission.objects.filter(
+                    pk=submission.pk, status=Submission.RUNNING
+                )
+                if running.update(**fields):
+                    record_verdict(submission, True, False)
+            judge_metrics.flush()
@@ -0,0 +1,106 @@
+import math
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+from .constants import (
+    COMPILE_SLOTS,
+    RUN_SLOTS,
+    JUDGE_MAX_QUEUE,
+    JUDGE_SLOT_DIR,
+    JUDGE_SLOT_POLL_INTERVAL,
+    JUDGE_SLOT_TIMEOUT,
+    JUDGE_ESTIMATE_SECONDS,
+)
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no flock, compilers and test binaries run without a cap
+    fcntl = None
+
+
+class JudgeBusy(Exception):
+    def __init__(self, retry_after: int) -> None:
+        plural = "s" if retry_after != 1 else ""
+        super().__init__(f"Judge busy, retry in {retry_after} second{plural}")
+        self.retry_after = retry_after
+
+
+def retry_after(queue_length: int) -> int:
+    # rough time until the queue ahead of a new submission drains
+    return max(1, math.ceil(queue_length * JUDGE_ESTIMATE_SECONDS / RUN_SLOTS))
+
+
+# caps how many compilers and test binaries run at once on the host. A slot is
+# an flock on one of a fixed set of files, so judge workers, web workers judging
+# inline and management commands all draw from the same slots, and the slots of
+# a process that dies are freed along with it
+class JudgeLimiter:
+    def __init__(
+        self, directory: str, compile_slots: int, run_slots: int, max_waiting: int
+    ) -> None:
+        self._directory = directory
+        self._slots = {"compile": compile_slots, "run": run_slots, "waiting": max_waiting}
+
+    def _take(self, kind: str) -> Optional[int]:
+        # the descriptor holding a free slot of that kind, None when all are taken
+        os.makedirs(self._directory, exist_ok=True)
+        for i in range(self._slots[kind]):
+            path = os.path.join(self._directory, f"{kind}-{i}.lock")
+            fd = os.open(path, os.O_CREAT | os.O_RDWR)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    def waiting(self) -> int:
+        if fcntl is None:
+            return 0
+        # taking and giving back every free place in line leaves the taken ones
+        free = []
+        try:
+            fd = self._take("waiting")
+            while fd is not None:
+                free.append(fd)
+                fd = self._take("waiting")
+        finally:
+            for fd in free:
+                os.close(fd)
+        return self._slots["waiting"] - len(free)
+
+    @contextmanager
+    def _slot(self, kind: str):
+        if fcntl is None:
+            yield
+            return
+        # turn away work instead of letting an unbounded line build up
+        ticket = self._take("waiting")
+        if ticket is None:
+            raise JudgeBusy(retry_after(self._slots["waiting"]))
+        try:
+            deadline = time.monotonic() + JUDGE_SLOT_TIMEOUT
+            slot = self._take(kind)
+            while slot is None and time.monotonic() < deadline:
+                time.sleep(JUDGE_SLOT_POLL_INTERVAL)
+                slot = self._take(kind)
+        finally:
+            os.close(ticket)
+        if slot is None:
+            raise JudgeBusy(retry_after(self.waiting()))
+        try:
+            yield
+        finally:
+            # closing the file gives the slot back
+            os.close(slot)
+
+    def compile_slot(self):
+        return self._slot("compile")
+
+    def run_slot(self):
+        return self._slot("run")
+
+
+judge_limiter = JudgeLimiter(JUDGE_SLOT_DIR, COMPILE_SLOTS, RUN_SLOTS, JUDGE_MAX_QUEUE)
@@ -0,0 +1,46 @@
+import os
+import sys
+from typing import Dict, List
+
+try:
+    import resource
+except ImportError:
+    # Windows has no rlimits or rusage, submissions run with the timeout only
+    resource = None
+
+
+# the resource limits a submission runs under and the usage it reports, the same
+# for the C++ and Python judges. Nothing here imports Django or the rest of
+# linnncode, it also runs as a script in front of every test binary
+
+
+def limit_resources(cpu_time: int, memory: int, output: int) -> None:
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_time, cpu_time + 1))
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (output, output))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+
+def usage_of(rusage) -> Dict:
+    # CPU time and peak memory out of a getrusage or wait4 result
+    return {
+        "cpu_time": rusage.ru_utime + rusage.ru_stime,
+        # kilobytes on Linux, bytes on macOS
+        "memory": rusage.ru_maxrss // (1024 if sys.platform == "darwin" else 1),
+    }
+
+
+def limited(args: List[str], cpu_time: int, memory: int, output: int) -> List[str]:
+    # args run under the limits, set by this file run as a script that then execs
+    # them. A preexec_fn would do it in the forked child of a threaded process,
+    # which isn't safe
+    if resource is None:
+        return args
+    limits = [str(cpu_time), str(memory), str(output)]
+    return [sys.executable, "-S", os.path.abspath(__file__), *limits, *args]
+
+
+if __name__ == "__main__":
+    cpu_time, memory, output = (int(value) for value in sys.argv[1:4])
+    limit_resources(cpu_time, memory, output)
+    os.execv(sys.argv[4], sys.argv[4:])
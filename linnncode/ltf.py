@@ -0,0 +1,89 @@
+import io
+import re
+import sys
+import time
+import traceback
+from typing import Callable, Dict
+
+from .constants import CPU_TIME_LIMIT, MEMORY_LIMIT, OUTPUT_LIMIT
+from .limits import limit_resources, resource, usage_of
+
+
+# Python counterpart of LTF.h, runs a submission's test functions and reports
+# each one with the same record LTF::MODE::JSON prints
+SUCCESS = "SUCCESS"
+FAIL = "FAIL"
+
+# test functions are found by name, like the C++ registrations test1..N
+TEST_NAME = re.compile(r"test\d+")
+
+
+class LTFStatus:
+    def __init__(self, code: str = FAIL, line: int = 0) -> None:
+        self.code = code
+        self.line = line
+
+
+class CompilationError(Exception):
+    pass
+
+
+def run_all(source: str, emit: Callable[[Dict], None], debug: bool = False) -> None:
+    # the tests see LTF the way C++ tests see the LTF namespace
+    namespace = {"__name__": "__submission__", "LTF": sys.modules[__name__]}
+    try:
+        program = compile(source, "<submission>", "exec")
+    except SyntaxError as e:
+        raise CompilationError(str(e))
+    exec(program, namespace)
+
+    # same order as the std::map LTF keeps its tests in
+    for name in sorted(key for key in namespace if TEST_NAME.fullmatch(key)):
+        messages = []
+        start = time.perf_counter_ns()
+        try:
+            status = namespace[name](debug)
+        except Exception:
+            status = LTFStatus(FAIL)
+            messages.append(traceback.format_exc(limit=-1).strip().splitlines()[-1])
+        elapsed = time.perf_counter_ns() - start
+        # a test may return an LTFStatus or just whether it passed
+        if not isinstance(status, LTFStatus):
+            status = LTFStatus(SUCCESS if status else FAIL)
+        emit(
+            {
+                "suite": "MAIN",
+                "name": name,
+                "status": status.code,
+                "ns": elapsed,
+                "line": status.line,
+                "messages": messages,
+            }
+        )
+
+
+def usage() -> Dict:
+    if resource is None:
+        return None
+    return usage_of(resource.getrusage(resource.RUSAGE_SELF))
+
+
+# entry point of a pooled interpreter, judges exactly one submission and exits
+def serve(conn) -> None:
+    source = conn.recv()
+    # a forkserver child with no other threads, the limits can be set right here
+    if resource is not None:
+        limit_resources(CPU_TIME_LIMIT, MEMORY_LIMIT, OUTPUT_LIMIT)
+    # whatever the submission prints is not part of the verdict
+    sys.stdout = io.StringIO()
+    error = ""
+    try:
+        run_all(source, lambda record: conn.send(("record", record)))
+    except CompilationError:
+        error = "Compilation Error"
+    except MemoryError:
+        error = "Memory Limit Exceeded"
+    except BaseException:
+        error = "CalledProcessError"
+    conn.send(("done", error, usage()))
+    conn.close()
@@ -0,0 +1,117 @@
+import os
+from collections import defaultdict
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from linnncode import benchmark
+from linnncode.constants import JUDGE_DIR, RUN_SLOTS
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a test database with problems of different suite sizes and judge "
+        "concurrent submissions, reporting throughput and compile and run latency"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--submissions", type=int, default=100)
+        parser.add_argument("--concurrency", type=int, default=RUN_SLOTS * 2)
+        parser.add_argument(
+            "--suite-sizes",
+            default="1,10,50",
+            help="number of test cases in each seeded problem's suite",
+        )
+        parser.add_argument(
+            "--mix",
+            default=",".join(f"{k}={v}" for k, v in benchmark.BENCHMARK_MIX.items()),
+            help="share of pass, fail, compile and timeout submissions",
+        )
+        parser.add_argument(
+            "--via",
+            choices=["driver", "view", "both"],
+            default="both",
+            help="straight through TestDriver, through problem_detail_view, or both",
+        )
+        parser.add_argument(
+            "--warm",
+            action="store_true",
+            help="send identical code so runs after the first hit the binary cache",
+        )
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options["suite_sizes"].split(",")]
+            mix = benchmark.parse_mix(options["mix"])
+        except ValueError as e:
+            raise CommandError(e)
+
+        # a file rather than SQLite's in-memory database, so the judging threads
+        # each get their own connection and wait on locks instead of failing
+        test_settings = connection.settings_dict["TEST"]
+        if connection.vendor == "sqlite" and not test_settings["NAME"]:
+            test_settings["NAME"] = os.path.join(JUDGE_DIR, "benchmark.sqlite3")
+        # cached suites are keyed by id and version, which the seeded ones share
+        # with the real ones
+        caches = {
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        }
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, serialize=False)
+        try:
+            # the test client's requests come from testserver
+            hosts = [*settings.ALLOWED_HOSTS, "testserver"]
+            with override_settings(CACHES=caches, ALLOWED_HOSTS=hosts):
+                problems = benchmark.seed_problems(sizes)
+                user = User.objects.create_user("benchmark")
+                work = benchmark.plan(problems, options["submissions"], mix, options["seed"])
+                vias = ["driver", "view"] if options["via"] == "both" else [options["via"]]
+                for via in vias:
+                    samples, wall = benchmark.run_load(
+                        work,
+                        via,
+                        options["concurrency"],
+                        user,
+                        unique=not options["warm"],
+                    )
+                    self.report(via, samples, wall)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def report(self, via, samples, wall):
+        summary = benchmark.summarize(samples, wall)
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\nthrough {via}"))
+        self.stdout.write(
+            f"{summary['submissions']} submissions in {wall:.2f}s, "
+            f"{summary['throughput']:.2f} per second"
+        )
+        for stage in ("latency", "compile", "run"):
+            self.stdout.write(self.percentiles(stage, summary[stage]))
+        outcomes = ", ".join(f"{k} {v}" for k, v in sorted(summary["outcomes"].items()))
+        self.stdout.write(f"outcomes: {outcomes}")
+        if summary["mismatches"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{summary['mismatches']} submissions got an unexpected verdict"
+                )
+            )
+        for sample in samples:
+            if "exception" in sample:
+                self.stdout.write(self.style.ERROR(f"judge raised: {sample['exception']}"))
+                break
+
+        # latency by suite size and by kind of submission
+        for key in ("suite", "kind"):
+            groups = defaultdict(list)
+            for sample in samples:
+                groups[sample[key]].append(sample)
+            for name, group in sorted(groups.items()):
+                part = benchmark.summarize(group, wall)
+                self.stdout.write(self.percentiles(f"  {name}", part["latency"]))
+
+    def percentiles(self, name, values):
+        return f"{name}: " + ", ".join(
+            f"p{p} {seconds * 1000:.1f} ms" for p, seconds in values.items()
+        )
@@ -0,0 +1,126 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from linnncode.models import CodeBlob, Problem, Submission
+from linnncode.views import submission_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a test database with submissions and time the list page queries "
+        "with and without their indexes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--submissions", type=int, default=2_000_000)
+        parser.add_argument("--problems", type=int, default=1000)
+        parser.add_argument("--users", type=int, default=5000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--batch-size", type=int, default=50_000)
+
+    def handle(self, *args, **options):
+        # never touch the real database, the test one is thrown away afterwards
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, serialize=False)
+        try:
+            self.seed(options)
+            self.report("with indexes", options["repeat"])
+            self.set_indexes(False)
+            self.report("without indexes", options["repeat"])
+            self.set_indexes(True)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, options):
+        start = time.monotonic()
+        User.objects.bulk_create(
+            User(username=f"user{i}") for i in range(options["users"])
+        )
+        Problem.objects.bulk_create(
+            Problem(title=f"Problem {i}", description="x" * 1000, prewritten_code="")
+            for i in range(options["problems"])
+        )
+        user_ids = list(User.objects.values_list("id", flat=True))
+        problem_ids = list(Problem.objects.values_list("id", flat=True))
+
+        # straight inserts, date is auto_now_add so the ORM would overwrite it
+        table = Submission._meta.db_table
+        sql = (
+            f"INSERT INTO {table} (user_id, problem_id, date, blob_id, success, "
+            "language, status) VALUES (%s, %s, %s, %s, %s, %s, %s)"
+        )
+        now = timezone.now()
+        blob = CodeBlob.store("int add(int a, int b) { return a + b; }\n" * 10)
+        seeded = 0
+        while seeded < options["submissions"]:
+            count = min(options["batch_size"], options["submissions"] - seeded)
+            rows = []
+            for _ in range(count):
+                date = now - timedelta(seconds=random.randrange(365 * 24 * 3600))
+                rows.append(
+                    (
+                        random.choice(user_ids),
+                        random.choice(problem_ids),
+                        connection.ops.adapt_datetimefield_value(date),
+                        blob.hash,
+                        random.random() < 0.5,
+                        "cpp",
+                        Submission.DONE,
+                    )
+                )
+            with connection.cursor() as cursor:
+                cursor.executemany(sql, rows)
+            seeded += count
+            self.stdout.write(f"Seeded {seeded}/{options['submissions']} submissions")
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        self.stdout.write(f"Seeding took {time.monotonic() - start:.1f}s")
+
+    def queries(self):
+        problem_id = Problem.objects.order_by("?").values_list("id", flat=True)[0]
+        user_id = User.objects.order_by("?").values_list("id", flat=True)[0]
+        by_problem = submission_rows(Submission.objects.filter(problem_id=problem_id))
+        by_user = submission_rows(Submission.objects.filter(user_id=user_id))
+        # the same queries the submission list pages run
+        return [
+            ("problem submissions, first page", by_problem[:11]),
+            ("problem submissions, count", by_problem),
+            ("user submissions, first page", by_user[:11]),
+            ("user submissions, count", by_user),
+        ]
+
+    def report(self, title, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n{title}"))
+        for name, queryset in self.queries():
+            counting = name.endswith("count")
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                if counting:
+                    queryset.count()
+                else:
+                    list(queryset.all())
+                timings.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(
+                f"{name}: median {statistics.median(timings):.2f} ms, "
+                f"max {max(timings):.2f} ms"
+            )
+            # count() drops the ordering, so its plan does too
+            plan = queryset.order_by().explain() if counting else queryset.explain()
+            for line in plan.splitlines():
+                self.stdout.write(f"    {line}")
+
+    def set_indexes(self, enabled):
+        with connection.schema_editor() as schema_editor:
+            for index in Submission._meta.indexes:
+                if enabled:
+                    schema_editor.add_index(Submission, index)
+                else:
+                    schema_editor.remove_index(Submission, index)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
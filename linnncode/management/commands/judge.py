@@ -0,0 +1,43 @@
+import multiprocessing
+import signal
+import sys
+from django.core.management.base import BaseCommand
+from django.db import connections
+from linnncode.constants import JUDGE_WORKERS
+from linnncode.driver import TestBuilder
+from linnncode.judge import work
+from linnncode.models import Submission
+
+
+class Command(BaseCommand):
+    help = "Run a pool of judge worker processes that grade pending submissions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=JUDGE_WORKERS)
+
+    def handle(self, *args, **options):
+        # build the precompiled header once before forking the workers
+        TestBuilder.init_LTF()
+        # submissions left running by a previous judge that died go back in the queue
+        Submission.objects.filter(status=Submission.RUNNING).update(
+            status=Submission.PENDING
+        )
+        # every worker has to open its own database connection
+        connections.close_all()
+
+        context = multiprocessing.get_context("fork")
+        workers = [context.Process(target=work) for _ in range(options["workers"])]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Judge running with {len(workers)} workers")
+
+        # stop the workers with the judge, on Ctrl-C as well as on a service stop
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for worker in workers:
+                worker.terminate()
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from linnncode.models import CodeBlob
+
+
+class Command(BaseCommand):
+    help = "Delete the stored code no submission uses anymore"
+
+    def handle(self, *args, **options):
+        # a submission created with one of these blobs while this runs fails
+        # its foreign key check, run it when nobody is submitting, e.g. nightly
+        deleted, _ = CodeBlob.objects.filter(submissions=None).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} unused code blobs"))
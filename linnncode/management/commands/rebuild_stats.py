@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from linnncode.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = "Recount every problem's and user's submission statistics from scratch"
+
+    def handle(self, *args, **options):
+        rebuild_stats()
+        self.stdout.write(self.style.SUCCESS("Statistics rebuilt"))
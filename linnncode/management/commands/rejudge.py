@@ -0,0 +1,154 @@
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Q
+from linnncode.constants import REJUDGE_BATCH_SIZE, REJUDGE_CHECKPOINT
+from linnncode.driver import TestBuilder
+from linnncode.judge import VERDICT_FIELDS, regrade
+from linnncode.metrics import judge_metrics
+from linnncode.models import Submission
+from linnncode.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = "Judge existing submissions again, e.g. after their test suite changed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--problem", type=int, help="problem id")
+        parser.add_argument("--user", help="username")
+        parser.add_argument("--since", type=date.fromisoformat, help="YYYY-MM-DD")
+        parser.add_argument("--until", type=date.fromisoformat, help="YYYY-MM-DD")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--batch-size", type=int, default=REJUDGE_BATCH_SIZE)
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="ignore the progress of an interrupted rejudge and start over",
+        )
+
+    def handle(self, *args, **options):
+        # pending and running submissions belong to the judge workers
+        submissions = Submission.objects.filter(status=Submission.DONE)
+        if options["problem"] is not None:
+            submissions = submissions.filter(problem_id=options["problem"])
+        if options["user"] is not None:
+            submissions = submissions.filter(user__username=options["user"])
+        if options["since"] is not None:
+            submissions = submissions.filter(date__date__gte=options["since"])
+        if options["until"] is not None:
+            submissions = submissions.filter(date__date__lte=options["until"])
+
+        # a checkpoint only applies to a rejudge of the same submissions
+        query = {
+            key: str(options[key]) if options[key] is not None else None
+            for key in ("problem", "user", "since", "until")
+        }
+        last_id = 0
+        # submissions the judge was too busy for, rejudged on the next run
+        skipped = []
+        checkpoint = self.load_checkpoint()
+        if checkpoint and options["restart"]:
+            os.remove(REJUDGE_CHECKPOINT)
+        elif checkpoint and checkpoint["query"] == query:
+            last_id = checkpoint["last_id"]
+            skipped = checkpoint.get("skipped", [])
+            self.stdout.write(f"Resuming after submission {last_id}")
+        elif checkpoint:
+            raise CommandError(
+                f"An interrupted rejudge of {checkpoint['query']} has not finished, "
+                "run it again to resume or pass --restart to discard it"
+            )
+
+        ids = list(
+            submissions.filter(Q(id__gt=last_id) | Q(id__in=skipped))
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        # skipped last time and not judged yet, they stay in the checkpoint until they are
+        retry = set(skipped).intersection(ids)
+        skipped = []
+        total = len(ids)
+        if not total:
+            self.stdout.write("Nothing to rejudge")
+            return
+
+        # build the precompiled header and harness once before forking the workers
+        TestBuilder.init_LTF()
+        # every worker has to open its own database connection
+        connections.close_all()
+
+        done = 0
+        batch = []
+        start = time.monotonic()
+        context = multiprocessing.get_context("fork")
+        executor = ProcessPoolExecutor(max_workers=options["workers"], mp_context=context)
+        try:
+            # results come back in id order, so everything up to the last one
+            # written is done or skipped, the checkpoint is that id and the skipped
+            for pk, fields in executor.map(regrade, ids):
+                last_id = max(last_id, pk)
+                retry.discard(pk)
+                if fields is None:
+                    skipped.append(pk)
+                    continue
+                batch.append(Submission(pk=pk, **fields))
+                if len(batch) >= options["batch_size"]:
+                    done += self.flush(batch, query, last_id, skipped + sorted(retry))
+                    self.progress(done, total, start)
+                    batch = []
+        except KeyboardInterrupt:
+            executor.shutdown(wait=False, cancel_futures=True)
+            done += self.flush(batch, query, last_id, skipped + sorted(retry))
+            self.stdout.write(
+                f"Interrupted after {done}/{total}, run the same command to resume"
+            )
+            return
+        executor.shutdown()
+        done += self.flush(batch, query, last_id, skipped + sorted(retry))
+        self.progress(done, total, start)
+        if skipped:
+            # the checkpoint stays, running the command again judges only these
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Rejudged {done} submissions, skipped {len(skipped)} the judge "
+                    "was too busy for, run the same command to rejudge them"
+                )
+            )
+            return
+        os.remove(REJUDGE_CHECKPOINT)
+        self.stdout.write(self.style.SUCCESS(f"Rejudged {done} submissions"))
+
+    def load_checkpoint(self):
+        try:
+            with open(REJUDGE_CHECKPOINT, "r") as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def flush(self, batch, query, last_id, skipped) -> int:
+        if batch:
+            pks = [submission.pk for submission in batch]
+            touched = Submission.objects.filter(pk__in=pks).values_list("problem", "user")
+            with judge_metrics.timer("save"), transaction.atomic():
+                Submission.objects.bulk_update(batch, VERDICT_FIELDS)
+                # recount the problems and users whose verdicts may have changed
+                rebuild_stats(
+                    {problem for problem, _ in touched}, {user for _, user in touched}
+                )
+        os.makedirs(os.path.dirname(REJUDGE_CHECKPOINT), exist_ok=True)
+        with open(REJUDGE_CHECKPOINT, "w") as file:
+            json.dump({"query": query, "last_id": last_id, "skipped": skipped}, file)
+        judge_metrics.flush()
+        return len(batch)
+
+    def progress(self, done, total, start):
+        rate = done / max(time.monotonic() - start, 1e-9)
+        left = (total - done) / rate if rate else 0
+        self.stdout.write(
+            f"Rejudged {done}/{total} ({rate:.1f}/s, about {left:.0f}s left)"
+        )
@@ -0,0 +1,255 @@
+import glob
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+from .constants import METRICS_BUCKETS, METRICS_DIR
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no flock, files of finished processes are kept
+    fcntl = None
+
+
+# type and help text of everything the judge reports
+METRICS = {
+    "linnncode_judge_stage_seconds": (
+        "histogram",
+        "Seconds spent in each stage of judging a submission",
+    ),
+    "linnncode_judge_submissions_total": (
+        "counter",
+        "Submissions judged, by language and outcome",
+    ),
+    "linnncode_judge_cache_total": (
+        "counter",
+        "Suite, binary and result cache lookups, by whether they hit",
+    ),
+    "linnncode_judge_queue_depth": (
+        "gauge",
+        "Submissions waiting for a judge worker",
+    ),
+    "linnncode_judge_running": (
+        "gauge",
+        "Submissions being judged right now",
+    ),
+}
+
+STAGE_SECONDS = "linnncode_judge_stage_seconds"
+
+# outcome label of each judge error, anything else not listed is "error"
+OUTCOMES = {
+    "Compilation Error": "compile_error",
+    "Execution Timeout": "timeout",
+    "CPU Time Limit Exceeded": "timeout",
+    "Memory Limit Exceeded": "memory_limit",
+    "Output Limit Exceeded": "output_limit",
+    "CalledProcessError": "called_process_error",
+}
+
+
+def outcome(success: bool, error: Optional[str]) -> str:
+    if error:
+        return OUTCOMES.get(error, "error")
+    return "accepted" if success else "wrong_answer"
+
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# a process's file is named after its pid and when it started counting, so a
+# reused pid never overwrites the file of the process that had it before
+PROCESS_FILE = re.compile(r"(\d+)-\d+\.json")
+# the totals of processes that have exited, their files are folded into it
+RETIRED_FILE = "retired.json"
+
+
+# counters and histograms of one process, written to a file of its own so the
+# process serving /metrics can add up those of every judge worker, like
+# prometheus_client's multiprocess mode
+class JudgeMetrics:
+    def __init__(self, directory: str) -> None:
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._pid = None
+        self._file = None
+        self._counters = None
+        self._histograms = None
+
+    def _reset(self) -> None:
+        # a forked worker starts from zero, its parent still reports its own
+        self._pid = os.getpid()
+        self._file = f"{self._pid}-{time.time_ns()}.json"
+        self._counters = {}
+        self._histograms = {}
+
+    def count(self, name: str, amount: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    # seconds a stage of the judge took, e.g. "compile" or "run"
+    def observe(self, stage: str, seconds: float) -> None:
+        key = (STAGE_SECONDS, (("stage", stage),))
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            # per bucket counts with +Inf last, then the sum
+            histogram = self._histograms.setdefault(
+                key, [0] * (len(METRICS_BUCKETS) + 1) + [0.0]
+            )
+            index = len(METRICS_BUCKETS)
+            for i, bound in enumerate(METRICS_BUCKETS):
+                if seconds <= bound:
+                    index = i
+                    break
+            histogram[index] += 1
+            histogram[-1] += seconds
+
+    @contextmanager
+    def timer(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    # write this process's totals out, called after each judged submission
+    def flush(self) -> None:
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            state = dump(self._counters, self._histograms)
+        self._write(self._file, state)
+
+    def _write(self, name: str, state: Dict) -> None:
+        os.makedirs(self._directory, exist_ok=True)
+        # written aside and moved in place, a scrape never reads half a file
+        fd, temp = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as file:
+                json.dump(state, file)
+            os.replace(temp, os.path.join(self._directory, name))
+        except BaseException:
+            os.remove(temp)
+            raise
+
+    def collect(self) -> Tuple[Dict, Dict]:
+        # counters and histograms added up over the files of every process
+        self.flush()
+        if fcntl is None:
+            return self._add_up()
+        os.makedirs(self._directory, exist_ok=True)
+        # one scrape at a time folds finished processes into the retired totals
+        with open(os.path.join(self._directory, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._retire()
+            return self._add_up()
+
+    def _add_up(self) -> Tuple[Dict, Dict]:
+        counters = {}
+        histograms = {}
+        for path in glob.glob(os.path.join(self._directory, "*.json")):
+            add(counters, histograms, load(path))
+        return counters, histograms
+
+    def _retire(self) -> None:
+        # files of processes that exited move into the retired totals, so they
+        # don't pile up and the totals never go backwards
+        retired_path = os.path.join(self._directory, RETIRED_FILE)
+        finished = []
+        for entry in os.scandir(self._directory):
+            match = PROCESS_FILE.fullmatch(entry.name)
+            if match is not None and not alive(int(match.group(1))):
+                finished.append(entry.path)
+        if not finished:
+            return
+        counters = {}
+        histograms = {}
+        for path in [retired_path, *finished]:
+            add(counters, histograms, load(path))
+        self._write(RETIRED_FILE, dump(counters, histograms))
+        for path in finished:
+            os.remove(path)
+
+    # everything in the Prometheus text format, gauges are read by the caller
+    def render(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        counters, histograms = self.collect()
+        samples = {name: [] for name in METRICS}
+        for (name, labels), value in sorted(counters.items()):
+            samples[name].append(sample(name, labels, value))
+        for (name, labels), values in sorted(histograms.items()):
+            cumulative = 0
+            bounds = [str(bound) for bound in METRICS_BUCKETS] + ["+Inf"]
+            for bound, count in zip(bounds, values):
+                cumulative += count
+                le = labels + (("le", bound),)
+                samples[name].append(sample(f"{name}_bucket", le, cumulative))
+            samples[name].append(sample(f"{name}_sum", labels, values[-1]))
+            samples[name].append(sample(f"{name}_count", labels, cumulative))
+        for name, value in (gauges or {}).items():
+            samples[name].append(sample(name, (), value))
+
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples[name])
+        return "\n".join(lines) + "\n"
+
+
+def alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def load(path: str) -> Dict:
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {"counters": [], "histograms": []}
+
+
+def dump(counters: Dict, histograms: Dict) -> Dict:
+    return {
+        "counters": [
+            [name, dict(labels), value] for (name, labels), value in counters.items()
+        ],
+        "histograms": [
+            [name, dict(labels), values]
+            for (name, labels), values in histograms.items()
+        ],
+    }
+
+
+def add(counters: Dict, histograms: Dict, state: Dict) -> None:
+    for name, labels, value in state["counters"]:
+        key = (name, tuple(sorted(labels.items())))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, values in state["histograms"]:
+        key = (name, tuple(sorted(labels.items())))
+        total = histograms.setdefault(key, [0] * len(values))
+        for i, value in enumerate(values):
+            total[i] += value
+
+
+def sample(name: str, labels: Labels, value: float) -> str:
+    if labels:
+        pairs = ",".join(f'{key}="{label}"' for key, label in labels)
+        name = f"{name}{{{pairs}}}"
+    return f"{name} {value}"
+
+
+judge_metrics = JudgeMetrics(METRICS_DIR)
@@ -0,0 +1,130 @@
+import cProfile
+import hmac
+import os
+import pstats
+import random
+import re
+import time
+import uuid
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from django.template.base import Template
+from .constants import PROFILE_DIR, PROFILE_KEEP, PROFILE_SAMPLE_RATE, PROFILE_TOKEN
+
+# when the session was last saved with a fresh expiry (a unix timestamp)
+REFRESHED_AT = "_refreshed_at"
+
+
+# sliding session expiry, the session is saved with a fresh expiry only once less
+# than half of SESSION_COOKIE_AGE is left, so browsing doesn't write on every request
+class SlidingSessionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        session = getattr(request, "session", None)
+        # anonymous visitors without a session don't get one
+        if session is None or session.is_empty():
+            return response
+        now = int(time.time())
+        refreshed_at = session.get(REFRESHED_AT, 0)
+        # a session saved anyway, e.g. on login, starts a new period for free
+        if session.modified or now - refreshed_at > settings.SESSION_COOKIE_AGE / 2:
+            session[REFRESHED_AT] = now
+        return response
+
+
+# how pstats names Template.render, its cumulative time is the time spent rendering
+# templates, includes and extends counted once
+TEMPLATE_RENDER = (
+    Template.render.__code__.co_filename,
+    Template.render.__code__.co_firstlineno,
+    "render",
+)
+
+
+# counts the queries run through a connection and the time they took
+class QueryTimer:
+    def __init__(self) -> None:
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+# profiles a request with cProfile when asked to, or for a sample of the traffic.
+# An asked for profile comes back as a Server-Timing header with the total, SQL
+# and template time, every profile is saved to PROFILE_DIR for pstats or snakeviz
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        asked = self.asked(request)
+        if not asked and random.random() >= PROFILE_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        queries = QueryTimer()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            start = time.perf_counter()
+            try:
+                profiler.enable()
+            except ValueError:
+                # another profiler is already running in this thread
+                return self.get_response(request)
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            total = time.perf_counter() - start
+
+        stats = pstats.Stats(profiler)
+        template = stats.stats.get(TEMPLATE_RENDER, (0, 0, 0, 0.0))[3]
+        name = self.save(request, stats, total)
+        if asked:
+            response["Server-Timing"] = (
+                f"total;dur={total * 1000:.1f}, "
+                f'sql;dur={queries.seconds * 1000:.1f};desc="{queries.count} queries", '
+                f"template;dur={template * 1000:.1f}"
+            )
+            response["X-Profile-Queries"] = str(queries.count)
+            response["X-Profile-File"] = name
+        return response
+
+    def asked(self, request) -> bool:
+        token = request.headers.get("X-Profile")
+        if PROFILE_TOKEN and token and hmac.compare_digest(token, PROFILE_TOKEN):
+            return True
+        # request.user is lazy, only looked up when the parameter is there
+        return request.GET.get("profile") == "1" and request.user.is_staff
+
+    def save(self, request, stats, total) -> str:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = re.sub(r"[^A-Za-z0-9]+", "-", request.path).strip("-") or "home"
+        name = (
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{request.method}-{path}-"
+            f"{total * 1000:.0f}ms-{uuid.uuid4().hex[:8]}.prof"
+        )
+        stats.dump_stats(os.path.join(PROFILE_DIR, name))
+        # only the newest profiles are kept, sampling must not fill the disk
+        profiles = sorted(
+            (entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith(".prof")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in profiles[:-PROFILE_KEEP]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+        return name
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.6 on 2026-10-18 08:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linnncode', '0017_alter_problem_img'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='error',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='language',
+            field=models.CharField(default='cpp', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='results',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done')], default='done', max_length=10),
+        ),
+    ]
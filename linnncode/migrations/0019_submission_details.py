@@ -0,0 +1,18 @@
+# Generated by Django 4.2.6 on 2026-10-18 08:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linnncode', '0018_submission_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='details',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
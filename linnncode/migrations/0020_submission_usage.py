@@ -0,0 +1,23 @@
+# Generated by Django 4.2.6 on 2026-10-18 08:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linnncode', '0019_submission_details'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='cpu_time',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='memory',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.6 on 2026-10-18 08:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linnncode', '0020_submission_usage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testcase',
+            name='language',
+            field=models.CharField(choices=[('cpp', 'C++'), ('python', 'Python')], default='cpp', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='language',
+            field=models.CharField(choices=[('cpp', 'C++'), ('python', 'Python')], default='cpp', max_length=10),
+        ),
+    ]
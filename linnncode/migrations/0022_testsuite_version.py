@@ -0,0 +1,18 @@
+# Generated by Django 4.2.6 on 2026-10-18 08:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linnncode', '0021_testcase_language'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testsuite',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
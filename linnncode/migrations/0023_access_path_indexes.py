@@ -0,0 +1,41 @@
+# Generated by Django 4.2.6 on 2026-10-18 08:42
+
+from django.db import migrations, models
+
+
+# SQLite only uses an index for LIKE 'prefix%' when it collates like LIKE compares,
+# case insensitively
+def add_title_nocase_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS problem_title_nocase_idx "
+            "ON linnncode_problem (title COLLATE NOCASE)"
+        )
+
+
+def remove_title_nocase_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP INDEX IF EXISTS problem_title_nocase_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linnncode', '0022_testsuite_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='problem',
+            index=models.Index(fields=['title'], name='problem_title_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['problem', '-date'], name='submission_problem_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['user', '-date'], name='submission_user_date_idx'),
+        ),
+        migrations.RunPython(add_title_nocase_index, remove_title_nocase_index),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.6 on 2026-10-18 08:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linnncode', '0023_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='submission',
+            name='submission_problem_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='submission',
+            name='submission_user_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['problem', '-date', '-id'], name='submission_problem_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['user', '-date', '-id'], name='submission_user_date_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.6 on 2026-10-18 08:44
+
+from django.db import OperationalError, migrations
+
+
+# full text index of problem titles and descriptions, SQLite only, and only where
+# it was built with FTS5, elsewhere search falls back to a substring match
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    try:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS linnncode_problem_fts "
+            "USING fts5(title, description, tokenize='porter unicode61')"
+        )
+    except OperationalError:
+        return
+    Problem = apps.get_model("linnncode", "Problem")
+    for problem in Problem.objects.only("id", "title", "description").iterator():
+        schema_editor.execute(
+            "INSERT INTO linnncode_problem_fts (rowid, title, description) "
+            "VALUES (%s, %s, %s)",
+            [problem.id, problem.title, problem.description or ""],
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS linnncode_problem_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linnncode', '0024_submission_cursor_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.6 on 2026-10-18 08:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Q
+
+
+# the totals of every submission judged so far, like manage.py rebuild_stats
+def fill_stats(apps, schema_editor):
+    Submission = apps.get_model("linnncode", "Submission")
+    ProblemStats = apps.get_model("linnncode", "ProblemStats")
+    UserStats = apps.get_model("linnncode", "UserStats")
+    judged = Submission.objects.filter(status="done")
+    accepted = Q(success=True)
+    problems = (
+        judged.exclude(problem=None)
+        .values("problem_id")
+        .annotate(
+            submissions=Count("id"),
+            accepted=Count("id", filter=accepted),
+            solvers=Count("user", filter=accepted, distinct=True),
+        )
+        .order_by()
+    )
+    ProblemStats.objects.bulk_create(
+        (ProblemStats(**row) for row in problems.iterator()), batch_size=1000
+    )
+    users = (
+        judged.exclude(user=None)
+        .values("user_id")
+        .annotate(
+            submissions=Count("id"),
+            solved=Count("problem", filter=accepted, distinct=True),
+        )
+        .order_by()
+    )
+    UserStats.objects.bulk_create(
+        (UserStats(**row) for row in users.iterator()), batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('linnncode', '0025_problem_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProblemStats',
+            fields=[
+                ('problem', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='linnncode.problem')),
+                ('submissions', models.PositiveIntegerField(default=0)),
+                ('accepted', models.PositiveIntegerField(default=0)),
+                ('solvers', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('submissions', models.PositiveIntegerField(default=0)),
+                ('solved', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.6 on 2026-10-18 08:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+# everything solved so far, from the accepted submissions
+def fill_solved_problems(apps, schema_editor):
+    Submission = apps.get_model("linnncode", "Submission")
+    SolvedProblem = apps.get_model("linnncode", "SolvedProblem")
+    accepted = (
+        Submission.objects.filter(status="done", success=True)
+        .exclude(user=None)
+        .exclude(problem=None)
+        .values("user_id", "problem_id")
+        .annotate(first_solved_at=Min("date"), best_runtime=Min("cpu_time"))
+        .order_by()
+    )
+    SolvedProblem.objects.bulk_create(
+        (SolvedProblem(**row) for row in accepted.iterator()), batch_size=1000
+    )
+
+    # UserStats.solved counts SolvedProblem rows from now on, so both agree
+    UserStats = apps.get_model("linnncode", "UserStats")
+    solved = (
+        SolvedProblem.objects.filter(user=OuterRef("user"))
+        .values("user")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    UserStats.objects.update(solved=Coalesce(Subquery(solved), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('linnncode', '0026_problem_user_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolvedProblem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_solved_at', models.DateTimeField()),
+                ('best_runtime', models.FloatField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='userstats',
+            index=models.Index(fields=['-solved', 'submissions', 'user'], name='userstats_rank_idx'),
+        ),
+        migrations.AddField(
+            model_name='solvedproblem',
+            name='problem',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='solved_by', to='linnncode.problem'),
+        ),
+        migrations.AddField(
+            model_name='solvedproblem',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='solved', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='solvedproblem',
+            constraint=models.UniqueConstraint(fields=('user', 'problem'), name='solved_once'),
+        ),
+        migrations.RunPython(fill_solved_problems, migrations.RunPython.noop),
+    ]
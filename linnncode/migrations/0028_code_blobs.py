@@ -0,0 +1,70 @@
+# Generated by Django 4.2.6 on 2026-10-18 08:48
+
+import hashlib
+import zlib
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# move every submission's code into a blob, identical code shares one
+def code_to_blobs(apps, schema_editor):
+    Submission = apps.get_model("linnncode", "Submission")
+    CodeBlob = apps.get_model("linnncode", "CodeBlob")
+    submissions = Submission.objects.exclude(code=None).only("id", "code")
+    batch = []
+    for submission in submissions.iterator(chunk_size=1000):
+        digest = hashlib.sha256(submission.code.encode()).hexdigest()
+        CodeBlob.objects.get_or_create(
+            hash=digest,
+            defaults={
+                "data": zlib.compress(submission.code.encode()),
+                "size": len(submission.code),
+            },
+        )
+        submission.blob_id = digest
+        batch.append(submission)
+        if len(batch) >= 1000:
+            Submission.objects.bulk_update(batch, ["blob"])
+            batch = []
+    Submission.objects.bulk_update(batch, ["blob"])
+
+
+def blobs_to_code(apps, schema_editor):
+    Submission = apps.get_model("linnncode", "Submission")
+    submissions = Submission.objects.exclude(blob=None).select_related("blob")
+    batch = []
+    for submission in submissions.iterator(chunk_size=1000):
+        submission.code = zlib.decompress(submission.blob.data).decode()
+        batch.append(submission)
+        if len(batch) >= 1000:
+            Submission.objects.bulk_update(batch, ["code"])
+            batch = []
+    Submission.objects.bulk_update(batch, ["code"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linnncode', '0027_solved_problems'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodeBlob',
+            fields=[
+                ('hash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('data', models.BinaryField()),
+                ('size', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='blob',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='submissions', to='linnncode.codeblob'),
+        ),
+        migrations.RunPython(code_to_blobs, blobs_to_code),
+        migrations.RemoveField(
+            model_name='submission',
+            name='code',
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.6 on 2026-10-18 09:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linnncode', '0028_code_blobs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['status', 'id'], name='submission_status_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.6 on 2026-10-18 09:25
+
+import hashlib
+
+from django.db import migrations, models
+
+
+# the same hash as TestSuite.refresh_content_hash
+def fill_content_hash(apps, schema_editor):
+    TestSuite = apps.get_model("linnncode", "TestSuite")
+    TestCase = apps.get_model("linnncode", "TestCase")
+    for suite in TestSuite.objects.all():
+        digest = hashlib.sha256()
+        cases = TestCase.objects.filter(test_suite=suite).order_by("id")
+        for language, test_case in cases.values_list("language", "test_case"):
+            for part in (language, test_case):
+                digest.update(part.encode())
+                digest.update(b"\0")
+        suite.content_hash = digest.hexdigest()
+        suite.save(update_fields=["content_hash"])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linnncode', '0029_submission_status_index'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='testsuite',
+            name='version',
+        ),
+        migrations.AddField(
+            model_name='testsuite',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.RunPython(fill_content_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.6 on 2026-10-18 09:42
+
+from django.db import migrations
+
+
+# problems are searched through the full text index since 0025, nothing filters
+# on a title prefix any more, so neither title index from 0023 is used
+def drop_title_nocase_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP INDEX IF EXISTS problem_title_nocase_idx")
+
+
+def add_title_nocase_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS problem_title_nocase_idx "
+            "ON linnncode_problem (title COLLATE NOCASE)"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linnncode', '0030_suite_content_hash'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='problem',
+            name='problem_title_prefix_idx',
+        ),
+        migrations.RunPython(drop_title_nocase_index, add_title_nocase_index),
+    ]
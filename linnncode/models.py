@@ -1,3 +1,5 @@
+import hashlib
+import zlib
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -9,14 +11,40 @@ def get_default_image():
 # will have list of test cases into text field
 class TestSuite(models.Model):
     title = models.CharField(max_length=50, null=True)
+    # sha256 of its test cases, kept up to date by the signals on TestCase.
+    # Caches of anything built from the test cases are keyed by it, so they
+    # can't serve the tests of a suite another database had under the same id
+    content_hash = models.CharField(max_length=64, blank=True, default="")
 
     def __str__(self):
         return f"TestSuite: {self.title}"
 
+    # for changes to its test cases the signals don't see, bulk_create and
+    # QuerySet.update
+    def refresh_content_hash(self) -> str:
+        cases = self.test_cases.order_by("id").values_list("language", "test_case")
+        self.content_hash = content_hash(cases)
+        TestSuite.objects.filter(pk=self.pk).update(content_hash=self.content_hash)
+        return self.content_hash
+
+
+def content_hash(cases) -> str:
+    # of (language, test case) pairs in order
+    digest = hashlib.sha256()
+    for language, test_case in cases:
+        for part in (language, test_case):
+            digest.update(part.encode())
+            digest.update(b"\0")
+    return digest.hexdigest()
+
 
 class TestCase(models.Model):
+    LANGUAGE_CHOICES = [("cpp", "C++"), ("python", "Python")]
+
     title = models.CharField(max_length=50, null=True)
     test_case = models.TextField()
+    # submissions are only run against the test cases of their own language
+    language = models.CharField(max_length=10, choices=LANGUAGE_CHOICES, default="cpp")
 
     # one suite can have many test cases
     test_suite = models.ForeignKey(
@@ -42,15 +70,152 @@ class Problem(models.Model):
         return self.title
 
 
+# submitted source code, stored once per distinct content and compressed,
+# keyed by the sha256 of the code. Deleting a submission leaves its blob for
+# others with the same code, manage.py prune_blobs removes the unused ones
+class CodeBlob(models.Model):
+    hash = models.CharField(max_length=64, primary_key=True)
+    data = models.BinaryField()
+    # length of the code before compression
+    size = models.PositiveIntegerField()
+
+    @staticmethod
+    def digest(code: str) -> str:
+        return hashlib.sha256(code.encode()).hexdigest()
+
+    @classmethod
+    def store(cls, code: str) -> "CodeBlob":
+        blob, _ = cls.objects.get_or_create(
+            hash=cls.digest(code),
+            defaults={"data": zlib.compress(code.encode()), "size": len(code)},
+        )
+        return blob
+
+    def text(self) -> str:
+        return zlib.decompress(self.data).decode()
+
+    def __str__(self):
+        return f"CodeBlob: {self.hash}"
+
+
 # user submission
 class Submission(models.Model):
+    # judge states, a submission is created pending and a judge worker picks it up
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    STATUS_CHOICES = [(PENDING, "Pending"), (RUNNING, "Running"), (DONE, "Done")]
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
     date = models.DateTimeField(auto_now_add=True)
-    code = models.TextField(null=True)
+    # the code lives in CodeBlob, read and set it through Submission.code
+    blob = models.ForeignKey(
+        CodeBlob, on_delete=models.PROTECT, related_name="submissions", null=True
+    )
     problem = models.ForeignKey(
         Problem, on_delete=models.CASCADE, related_name="submissions", null=True
     )
     success = models.BooleanField(default=False, null=True)
+    language = models.CharField(
+        max_length=10, choices=TestCase.LANGUAGE_CHOICES, default="cpp"
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=DONE)
+    # test name vs SUCCESS/FAIL, and the judge error if there was one
+    results = models.JSONField(null=True, blank=True)
+    # test name vs its run time in nanoseconds, failure line and messages
+    details = models.JSONField(null=True, blank=True)
+    # CPU time (in seconds) and peak memory (in kilobytes) of the test binary
+    cpu_time = models.FloatField(null=True, blank=True)
+    memory = models.PositiveIntegerField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # a problem's and a user's submissions, newest first, id breaks ties
+            # so history pages can seek straight to a (date, id) cursor
+            models.Index(
+                fields=["problem", "-date", "-id"], name="submission_problem_date_idx"
+            ),
+            models.Index(
+                fields=["user", "-date", "-id"], name="submission_user_date_idx"
+            ),
+            # the judge queue, pending or running submissions oldest first
+            models.Index(fields=["status", "id"], name="submission_status_idx"),
+        ]
+
+    @property
+    def code(self):
+        if not hasattr(self, "_code"):
+            self._code = self.blob.text() if self.blob_id is not None else None
+        return self._code
+
+    @code.setter
+    def code(self, code):
+        # stored as a blob on the next save
+        self._code = code
+        self._code_changed = True
+
+    def save(self, *args, **kwargs):
+        if getattr(self, "_code_changed", False):
+            self.blob = CodeBlob.store(self._code) if self._code is not None else None
+            self._code_changed = False
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "blob"}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Submission {self.id}"
+
+
+# running totals of a problem's judged submissions, kept up to date as verdicts
+# come in (linnncode/stats.py), rebuilt from scratch by manage.py rebuild_stats
+class ProblemStats(models.Model):
+    problem = models.OneToOneField(
+        Problem, on_delete=models.CASCADE, related_name="stats", primary_key=True
+    )
+    submissions = models.PositiveIntegerField(default=0)
+    accepted = models.PositiveIntegerField(default=0)
+    # users with at least one accepted submission
+    solvers = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"ProblemStats: {self.problem_id}"
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name="stats", primary_key=True
+    )
+    submissions = models.PositiveIntegerField(default=0)
+    # problems with at least one accepted submission
+    solved = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # leaderboard order, most solved first then fewest submissions
+            models.Index(
+                fields=["-solved", "submissions", "user"], name="userstats_rank_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"UserStats: {self.user_id}"
+
+
+# a problem a user solved, when they first did and their fastest accepted run
+class SolvedProblem(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="solved")
+    problem = models.ForeignKey(
+        Problem, on_delete=models.CASCADE, related_name="solved_by"
+    )
+    first_solved_at = models.DateTimeField()
+    # CPU time of the fastest accepted submission (in seconds)
+    best_runtime = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "problem"], name="solved_once"),
+        ]
+
+    def __str__(self):
+        return f"SolvedProblem: {self.user_id} {self.problem_id}"
@@ -0,0 +1,87 @@
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from .constants import EXECUTION_TIMEOUT, PYTHON_POOL_SIZE
+from . import ltf
+
+
+# keeps interpreters started and waiting with the Python LTF harness imported,
+# each runs one submission in its own process and is replaced afterwards
+class InterpreterPool:
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def instance(cls) -> "InterpreterPool":
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(PYTHON_POOL_SIZE)
+            return cls._instance
+
+    def __init__(self, size: int) -> None:
+        # a forkserver forks clean interpreters that already imported the harness,
+        # rather than copies of the whole Django process
+        self._context = multiprocessing.get_context("forkserver")
+        self._context.set_forkserver_preload(["linnncode.ltf"])
+        self._idle = queue.Queue()
+        for _ in range(size):
+            self._start()
+
+    def _start(self) -> None:
+        conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=ltf.serve, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        self._idle.put((process, conn))
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            # every interpreter is busy, start one more for this run
+            self._start()
+            return self._idle.get()
+
+    def run(
+        self, source: str, on_record: Optional[Callable[[Dict], None]] = None
+    ) -> Tuple[List[Dict], str, Optional[Dict]]:
+        # returns the test records, the error if any and the resource usage
+        process, conn = self._checkout()
+        records = []
+        error = ""
+        usage = None
+        try:
+            conn.send(source)
+            deadline = time.monotonic() + EXECUTION_TIMEOUT
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not conn.poll(remaining):
+                    error = "Execution Timeout"
+                    break
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    # the interpreter died, most likely on one of its rlimits
+                    process.join()
+                    if process.exitcode == -signal.SIGXCPU:
+                        error = "CPU Time Limit Exceeded"
+                    else:
+                        error = "CalledProcessError"
+                    break
+                if message[0] == "record":
+                    records.append(message[1])
+                    if on_record is not None:
+                        on_record(message[1])
+                    continue
+                _, error, usage = message
+                break
+        finally:
+            # never reuse an interpreter that ran user code
+            conn.close()
+            process.kill()
+            process.join()
+            threading.Thread(target=self._start, daemon=True).start()
+        return records, error, usage
@@ -0,0 +1,75 @@
+import re
+from typing import List
+from django.db import DatabaseError, connection
+from django.db.models import Q
+from .constants import SEARCH_MAX_RESULTS
+from .models import Problem
+
+# SQLite FTS5 index of problem titles and descriptions, rowid is the problem id,
+# created by migration 0025 where FTS5 is available
+SEARCH_TABLE = "linnncode_problem_fts"
+
+
+def search_available() -> bool:
+    # the table only comes and goes with migrations, so it is looked up once per
+    # database connection rather than on every search and every problem save
+    if connection.vendor != "sqlite":
+        return False
+    connection.ensure_connection()
+    found = getattr(connection, "linnncode_search_table", None)
+    if found is None or found[0] is not connection.connection:
+        tables = connection.introspection.table_names()
+        found = (connection.connection, SEARCH_TABLE in tables)
+        connection.linnncode_search_table = found
+    return found[1]
+
+
+def index_problem(problem: Problem) -> None:
+    if not search_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [problem.id])
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, title, description) VALUES (%s, %s, %s)",
+            [problem.id, problem.title, problem.description or ""],
+        )
+
+
+def unindex_problem(problem_id: int) -> None:
+    if not search_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [problem_id])
+
+
+def match_expression(query: str) -> str:
+    # every word has to appear, the last one may still be half typed, quoting
+    # keeps FTS5 operators in the query from being interpreted
+    words = re.findall(r"\w+", query)
+    if not words:
+        return ""
+    return " ".join(f'"{word}"' for word in words) + "*"
+
+
+# ids of the problems matching query, best match first, a title match weighs
+# more than a description match
+def search_problems(query: str) -> List[int]:
+    expression = match_expression(query)
+    if not expression:
+        return []
+    if search_available():
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+                    f"ORDER BY bm25({SEARCH_TABLE}, 10.0, 1.0) LIMIT %s",
+                    [expression, SEARCH_MAX_RESULTS],
+                )
+                return [row[0] for row in cursor.fetchall()]
+        except DatabaseError:
+            pass
+    # no full text index on this database, unranked substring match instead
+    matches = Problem.objects.filter(
+        Q(title__icontains=query) | Q(description__icontains=query)
+    )
+    return list(matches.order_by("id").values_list("id", flat=True)[:SEARCH_MAX_RESULTS])
@@ -0,0 +1,50 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .constants import PROBLEM_LIST_GENERATION
+from .models import Problem, TestCase, TestSuite
+from .search import index_problem, unindex_problem
+
+
+def refresh_content_hash(suite_id) -> None:
+    # the suite may be gone, its test cases are deleted along with it
+    for suite in TestSuite.objects.filter(pk=suite_id):
+        suite.refresh_content_hash()
+
+
+@receiver(pre_save, sender=TestCase)
+def test_case_moving(sender, instance, **kwargs):
+    # a test case moved to another suite also changes the suite it left
+    if instance.pk is None:
+        return
+    old = TestCase.objects.filter(pk=instance.pk).values_list("test_suite", flat=True)
+    for suite_id in old:
+        if suite_id != instance.test_suite_id:
+            refresh_content_hash(suite_id)
+
+
+@receiver(post_save, sender=TestCase)
+@receiver(post_delete, sender=TestCase)
+def test_case_changed(sender, instance, **kwargs):
+    refresh_content_hash(instance.test_suite_id)
+
+
+@receiver(post_save, sender=Problem)
+@receiver(post_delete, sender=Problem)
+def problem_changed(sender, instance, **kwargs):
+    # cached pages of the problem list are keyed by the generation, a new one
+    # leaves every page cached so far behind
+    try:
+        cache.incr(PROBLEM_LIST_GENERATION)
+    except ValueError:
+        cache.set(PROBLEM_LIST_GENERATION, 1, None)
+
+
+@receiver(post_save, sender=Problem)
+def problem_saved(sender, instance, **kwargs):
+    index_problem(instance)
+
+
+@receiver(post_delete, sender=Problem)
+def problem_deleted(sender, instance, **kwargs):
+    unindex_problem(instance.id)
@@ -0,0 +1,135 @@
+from typing import Iterable, Optional
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+from .models import ProblemStats, SolvedProblem, Submission, UserStats
+
+
+# keep the user's SolvedProblem row in step with a verdict, returns how the number
+# of problems they solved changed, -1, 0 or 1
+def record_solved(submission: Submission, was_success: bool) -> int:
+    if submission.user_id is None:
+        return 0
+    solved = SolvedProblem.objects.filter(
+        user_id=submission.user_id, problem_id=submission.problem_id
+    )
+    if submission.success:
+        row, created = SolvedProblem.objects.get_or_create(
+            user_id=submission.user_id,
+            problem_id=submission.problem_id,
+            defaults={
+                "first_solved_at": submission.date,
+                "best_runtime": submission.cpu_time,
+            },
+        )
+        if created:
+            return 1
+        if submission.date < row.first_solved_at:
+            solved.update(first_solved_at=submission.date)
+        if submission.cpu_time is not None and (
+            row.best_runtime is None or submission.cpu_time < row.best_runtime
+        ):
+            solved.update(best_runtime=submission.cpu_time)
+        return 0
+
+    if not was_success:
+        return 0
+    # an accepted submission was rejudged as failed, recount from the others
+    accepted = Submission.objects.filter(
+        user_id=submission.user_id, problem_id=submission.problem_id, success=True
+    ).aggregate(first=Min("date"), best=Min("cpu_time"))
+    if accepted["first"] is None:
+        return -solved.delete()[0]
+    solved.update(first_solved_at=accepted["first"], best_runtime=accepted["best"])
+    return 0
+
+
+# apply one verdict to the totals, first is whether the submission is judged for
+# the first time, was_success its verdict before when it's rejudged
+def record_verdict(submission: Submission, first: bool, was_success: bool) -> None:
+    success = bool(submission.success)
+    if submission.problem_id is None or (not first and success == was_success):
+        return
+    counted = int(first)
+    accepted = int(success) - int(was_success)
+
+    with transaction.atomic():
+        # the unique (user, problem) row decides whether the user newly solved it
+        solved = record_solved(submission, was_success)
+        ProblemStats.objects.get_or_create(problem_id=submission.problem_id)
+        ProblemStats.objects.filter(problem_id=submission.problem_id).update(
+            submissions=F("submissions") + counted,
+            accepted=F("accepted") + accepted,
+            solvers=F("solvers") + solved,
+        )
+        if submission.user_id is not None:
+            UserStats.objects.get_or_create(user_id=submission.user_id)
+            UserStats.objects.filter(user_id=submission.user_id).update(
+                submissions=F("submissions") + counted, solved=F("solved") + solved
+            )
+
+
+# recount the totals from the submissions, of everyone or just the given problems
+# and users, e.g. after a rejudge
+def rebuild_stats(
+    problem_ids: Optional[Iterable[int]] = None,
+    user_ids: Optional[Iterable[int]] = None,
+) -> None:
+    judged = Submission.objects.filter(status=Submission.DONE)
+    accepted = Q(success=True)
+
+    problems = judged.exclude(problem=None)
+    problem_stats = ProblemStats.objects.all()
+    if problem_ids is not None:
+        problem_ids = list(problem_ids)
+        problems = problems.filter(problem_id__in=problem_ids)
+        problem_stats = problem_stats.filter(problem_id__in=problem_ids)
+    problem_rows = [
+        ProblemStats(**row)
+        for row in problems.values("problem_id")
+        .annotate(
+            submissions=Count("id"),
+            accepted=Count("id", filter=accepted),
+            solvers=Count("user", filter=accepted, distinct=True),
+        )
+        .order_by()
+    ]
+
+    users = judged.exclude(user=None)
+    user_stats = UserStats.objects.all()
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        users = users.filter(user_id__in=user_ids)
+        user_stats = user_stats.filter(user_id__in=user_ids)
+    user_rows = [
+        UserStats(**row)
+        for row in users.values("user_id")
+        .annotate(
+            submissions=Count("id"),
+            solved=Count("problem", filter=accepted, distinct=True),
+        )
+        .order_by()
+    ]
+
+    # every (user, problem) pair of the given problems and of the given users
+    pairs = Q()
+    if problem_ids is not None:
+        pairs |= Q(problem_id__in=problem_ids)
+    if user_ids is not None:
+        pairs |= Q(user_id__in=user_ids)
+    solved_rows = [
+        SolvedProblem(**row)
+        for row in judged.filter(pairs, success=True)
+        .exclude(user=None)
+        .exclude(problem=None)
+        .values("user_id", "problem_id")
+        .annotate(first_solved_at=Min("date"), best_runtime=Min("cpu_time"))
+        .order_by()
+    ]
+
+    with transaction.atomic():
+        problem_stats.delete()
+        ProblemStats.objects.bulk_create(problem_rows, batch_size=1000)
+        user_stats.delete()
+        UserStats.objects.bulk_create(user_rows, batch_size=1000)
+        SolvedProblem.objects.filter(pairs).delete()
+        SolvedProblem.objects.bulk_create(solved_rows, batch_size=1000)
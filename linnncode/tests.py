@@ -1,3 +1,487 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from . import benchmark
+from .cache import BinaryCache
+from .constants import BINARY_CACHE_BYTES
+from .metrics import JudgeMetrics, judge_metrics
+from . import judge, models, views
+from .driver import TestBuilder
+from .limiter import JudgeBusy, JudgeLimiter
+from .models import ProblemStats, Submission
+from .stats import rebuild_stats, record_verdict
 
-# Create your tests here.
+# suites are cached by id and version, which the test database reuses
+LOCAL_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+# binaries, verdicts and metrics go to a directory of the test's own instead of
+# the one a running site and its judge workers share
+class JudgeDirMixin:
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        cache = BinaryCache(os.path.join(directory.name, "bin"), BINARY_CACHE_BYTES)
+        metrics = os.path.join(directory.name, "metrics")
+        for patcher in (
+            mock.patch("linnncode.utils.binary_cache", cache),
+            mock.patch.object(judge_metrics, "_directory", metrics),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class PercentileTests(SimpleTestCase):
+    def test_nearest_rank(self):
+        values = [float(n) for n in range(1, 101)]
+        self.assertEqual(benchmark.percentile(values, 50), 50.0)
+        self.assertEqual(benchmark.percentile(values, 95), 95.0)
+        self.assertEqual(benchmark.percentile(values, 99), 99.0)
+        self.assertEqual(benchmark.percentile([3.0], 99), 3.0)
+        self.assertEqual(benchmark.percentile([], 50), 0.0)
+
+    def test_parse_mix(self):
+        self.assertEqual(benchmark.parse_mix("pass=3,timeout=1"), {"pass": 3, "timeout": 1})
+        with self.assertRaises(ValueError):
+            benchmark.parse_mix("slow=1")
+
+
+class MetricsTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.metrics = JudgeMetrics(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_histogram_buckets(self):
+        self.metrics.observe("compile", 0.3)
+        self.metrics.observe("compile", 20)
+        text = self.metrics.render()
+        stage = 'linnncode_judge_stage_seconds_bucket{stage="compile"'
+        self.assertIn(f'{stage},le="0.25"}} 0', text)
+        self.assertIn(f'{stage},le="0.5"}} 1', text)
+        self.assertIn(f'{stage},le="+Inf"}} 2', text)
+        self.assertIn('linnncode_judge_stage_seconds_count{stage="compile"} 2', text)
+        self.assertIn("# TYPE linnncode_judge_stage_seconds histogram", text)
+
+    def test_adds_up_other_processes(self):
+        # what a judge worker with another pid left behind
+        other = {
+            "counters": [
+                [
+                    "linnncode_judge_submissions_total",
+                    {"language": "cpp", "outcome": "timeout"},
+                    2,
+                ]
+            ],
+            "histograms": [],
+        }
+        with open(os.path.join(self.directory.name, "1-0.json"), "w") as file:
+            json.dump(other, file)
+        self.metrics.count(
+            "linnncode_judge_submissions_total", language="cpp", outcome="timeout"
+        )
+        text = self.metrics.render({"linnncode_judge_queue_depth": 4})
+        self.assertIn(
+            'linnncode_judge_submissions_total{language="cpp",outcome="timeout"} 3',
+            text,
+        )
+        self.assertIn("linnncode_judge_queue_depth 4", text)
+
+    def test_retires_finished_processes(self):
+        # a pid no process has any more
+        process = subprocess.Popen(["true"])
+        process.wait()
+        counter = ["linnncode_judge_submissions_total", {"language": "cpp"}, 2]
+        for name in (f"{process.pid}-0.json", f"{process.pid}-1.json"):
+            with open(os.path.join(self.directory.name, name), "w") as file:
+                json.dump({"counters": [counter], "histograms": []}, file)
+        text = 'linnncode_judge_submissions_total{language="cpp"} 4'
+        self.assertIn(text, self.metrics.render())
+        self.assertEqual(
+            sorted(os.listdir(self.directory.name)), [".lock", "retired.json"]
+        )
+        self.assertIn(text, self.metrics.render())
+
+
+class LimiterTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    @mock.patch("linnncode.limiter.JUDGE_SLOT_TIMEOUT", 0.1)
+    def test_slots_are_shared(self):
+        # two limiters on the same directory, like two processes on one host
+        first = JudgeLimiter(self.directory, 1, 1, 2)
+        second = JudgeLimiter(self.directory, 1, 1, 2)
+        with first.compile_slot():
+            with self.assertRaises(JudgeBusy):
+                with second.compile_slot():
+                    pass
+            with second.run_slot():
+                pass
+        with second.compile_slot():
+            pass
+
+    def test_waiting_cap(self):
+        limiter = JudgeLimiter(self.directory, 1, 1, 0)
+        with self.assertRaises(JudgeBusy):
+            with limiter.run_slot():
+                pass
+        self.assertEqual(limiter.waiting(), 0)
+
+
+class StatsTests(TestCase):
+    def setUp(self):
+        self.problem = models.Problem.objects.create(title="p", prewritten_code="")
+        self.user = User.objects.create_user("stats")
+
+    def submit(self, success):
+        submission = Submission.objects.create(
+            code="", problem=self.problem, user=self.user, status=Submission.RUNNING
+        )
+        return self.rejudge(submission, success, first=True)
+
+    def rejudge(self, submission, success, first=False):
+        was_success = bool(submission.success)
+        submission.success = success
+        submission.status = Submission.DONE
+        submission.save()
+        record_verdict(submission, first, was_success)
+        return submission
+
+    def totals(self):
+        problem = ProblemStats.objects.get(problem=self.problem)
+        user = models.UserStats.objects.get(user=self.user)
+        solved = models.SolvedProblem.objects.filter(user=self.user).count()
+        return (
+            (problem.submissions, problem.accepted, problem.solvers),
+            (user.submissions, user.solved),
+            solved,
+        )
+
+    def assertTotals(self, expected):
+        self.assertEqual(self.totals(), expected)
+        # the same as counting everything again
+        rebuild_stats()
+        self.assertEqual(self.totals(), expected)
+
+    def test_first_verdict(self):
+        self.submit(False)
+        self.assertTotals(((1, 0, 0), (1, 0), 0))
+        self.submit(True)
+        self.assertTotals(((2, 1, 1), (2, 1), 1))
+
+    def test_accepted_rejudged_as_failed(self):
+        submission = self.submit(True)
+        self.rejudge(submission, False)
+        self.assertTotals(((1, 0, 0), (1, 0), 0))
+
+    def test_failed_rejudged_as_accepted(self):
+        submission = self.submit(False)
+        self.rejudge(submission, True)
+        self.assertTotals(((1, 1, 1), (1, 1), 1))
+
+    def test_judge_error_is_counted(self):
+        # as claim_next hands it over
+        submission = Submission.objects.create(
+            code="", problem=self.problem, user=self.user, status=Submission.RUNNING
+        )
+
+        class Stop(Exception):
+            pass
+
+        with mock.patch("linnncode.judge.InterpreterPool"), mock.patch(
+            "linnncode.judge.claim_next", side_effect=[submission, Stop]
+        ), mock.patch("linnncode.judge.judge", side_effect=RuntimeError("broken")):
+            with self.assertRaises(Stop):
+                judge.work()
+        submission.refresh_from_db()
+        self.assertEqual(submission.error, "Judge Error: broken")
+        self.assertTotals(((1, 0, 0), (1, 0), 0))
+
+
+class SubmissionPageTests(TestCase):
+    def setUp(self):
+        self.problem = models.Problem.objects.create(title="p", prewritten_code="")
+        self.user = User.objects.create_user("history")
+        start = timezone.now()
+        # several submissions share a date, the id decides their order
+        for minutes in (0, 0, 0, 1, 1, 2, 3):
+            submission = Submission.objects.create(
+                code="", problem=self.problem, user=self.user
+            )
+            Submission.objects.filter(pk=submission.pk).update(
+                date=start + timedelta(minutes=minutes)
+            )
+        self.submissions = views.submission_rows(Submission.objects.all())
+        self.newest_first = list(self.submissions.values_list("id", flat=True))
+
+    def page(self, after=None, before=None):
+        page = views.submission_page(self.submissions, after, before, per_page=2)
+        return [s.id for s in page["submissions"]], page
+
+    def test_pages_forward_and_back(self):
+        pages = []
+        ids, page = self.page()
+        self.assertIsNone(page["previous_cursor"])
+        pages.append(ids)
+        while page["next_cursor"]:
+            ids, page = self.page(after=page["next_cursor"])
+            pages.append(ids)
+        self.assertEqual(sum(pages, []), self.newest_first)
+        self.assertEqual(len(pages), 4)
+
+        back = [ids]
+        while page["previous_cursor"]:
+            ids, page = self.page(before=page["previous_cursor"])
+            back.append(ids)
+        self.assertEqual(back[::-1], pages)
+        self.assertIsNotNone(page["next_cursor"])
+
+    def test_malformed_cursor(self):
+        first, _ = self.page()
+        for token in ("garbage", "!!!", "", base64.urlsafe_b64encode(b"x|y").decode()):
+            with self.subTest(token=token):
+                self.assertEqual(self.page(after=token)[0], first)
+                self.assertEqual(self.page(before=token)[0], first)
+        self.client.force_login(self.user)
+        url = reverse("submissions", args=[self.problem.id])
+        self.assertEqual(self.client.get(url, {"after": "%%%"}).status_code, 200)
+
+
+class SuiteCacheTests(TestCase):
+    def add_case(self, suite, n):
+        return models.TestCase.objects.create(
+            title=f"test{n}", test_case=benchmark.BENCHMARK_TEST.format(n=n), test_suite=suite
+        )
+
+    def test_follows_test_cases(self):
+        suite = models.TestSuite.objects.create(title="suite")
+        self.add_case(suite, 1)
+        suite.refresh_from_db()
+        self.assertEqual(TestBuilder.get_tests(suite, "cpp")[1], 1)
+        self.add_case(suite, 2)
+        suite.refresh_from_db()
+        self.assertEqual(TestBuilder.get_tests(suite, "cpp")[1], 2)
+
+    def test_not_keyed_by_id(self):
+        # a suite that gets the id of a deleted one, e.g. after a reset database
+        suite = models.TestSuite.objects.create(title="old")
+        for n in (1, 2):
+            self.add_case(suite, n)
+        suite.refresh_from_db()
+        TestBuilder.get_tests(suite, "cpp")
+        pk = suite.pk
+        suite.delete()
+        suite = models.TestSuite.objects.create(pk=pk, title="new")
+        for n in (3, 4):
+            self.add_case(suite, n)
+        suite.refresh_from_db()
+        tests, count = TestBuilder.get_tests(suite, "cpp")
+        self.assertEqual(count, 2)
+        self.assertIn("test3", tests)
+        self.assertNotIn("test1", tests)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        patcher = mock.patch("linnncode.middleware.PROFILE_DIR", self.directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user("staff", is_staff=True)
+
+    def test_staff_query_parameter(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("my_submissions"), {"profile": "1"})
+        self.assertIn("template;dur=", response["Server-Timing"])
+        self.assertGreater(int(response["X-Profile-Queries"]), 0)
+        self.assertTrue(
+            os.path.exists(os.path.join(self.directory, response["X-Profile-File"]))
+        )
+
+    def test_not_for_other_users(self):
+        self.user.is_staff = False
+        self.user.save()
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("problems"), {"profile": "1"})
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    @mock.patch("linnncode.middleware.PROFILE_TOKEN", "secret")
+    def test_header_token(self):
+        response = self.client.get(reverse("home"), HTTP_X_PROFILE="secret")
+        self.assertIn("Server-Timing", response)
+        response = self.client.get(reverse("home"), HTTP_X_PROFILE="guess")
+        self.assertNotIn("Server-Timing", response)
+
+
+# the threads judging submissions need to see the seeded rows, so no wrapping
+# transaction
+@override_settings(CACHES=LOCAL_CACHE)
+class JudgeTests(JudgeDirMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.small, self.large = benchmark.seed_problems([1, 20])
+        self.user = User.objects.create_user("benchmark")
+
+    def test_driver_verdicts(self):
+        for kind in ("pass", "fail", "compile", "timeout"):
+            with self.subTest(kind=kind):
+                code = benchmark.submission_code(kind)
+                sample = benchmark.judge_with_driver(self.large, code)
+                self.assertEqual(sample["outcome"], kind)
+                self.assertGreater(sample["compile"], 0)
+                if kind == "compile":
+                    self.assertEqual(sample["run"], 0)
+                else:
+                    self.assertGreater(sample["run"], 0)
+
+    def test_output_without_newline(self):
+        # what the submission prints can't swallow the record after it
+        for body, kind in (("a + b", "pass"), ("a - b", "fail")):
+            with self.subTest(kind=kind):
+                code = f'int add(int a, int b) {{ std::cout << "debug"; return {body}; }}'
+                sample = benchmark.judge_with_driver(self.large, code)
+                self.assertEqual(sample["outcome"], kind)
+
+    def test_cached_binary_skips_compile(self):
+        code = benchmark.submission_code("pass")
+        benchmark.judge_with_driver(self.small, code)
+        sample = benchmark.judge_with_driver(self.small, code)
+        self.assertEqual(sample["outcome"], "pass")
+        self.assertEqual(sample["compile"], 0)
+
+    def test_view_verdict(self):
+        work = [(self.small, "pass"), (self.small, "fail"), (self.large, "compile")]
+        samples, _ = benchmark.run_load(work, "view", 1, self.user)
+        self.assertEqual(sorted(s["outcome"] for s in samples), ["compile", "fail", "pass"])
+        self.assertEqual(Submission.objects.filter(status=Submission.DONE).count(), 3)
+        self.assertEqual(ProblemStats.objects.get(problem=self.small).accepted, 1)
+
+    def test_language_without_tests(self):
+        # the benchmark suites only have C++ tests
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse("problem_detail", args=[self.small.id]),
+            {"code": "x = 1", "language": "python"},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Submission.objects.exists())
+
+    def test_metrics_endpoint(self):
+        benchmark.judge_with_driver(self.small, benchmark.submission_code("compile"))
+        judge_metrics.flush()
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn('linnncode_judge_stage_seconds_count{stage="compile"}', text)
+        self.assertIn('cache="binary",result="miss"', text)
+        self.assertIn("linnncode_judge_queue_depth 0", text)
+
+
+# the judge workers are forked, the mocks here go along with them
+@override_settings(CACHES=LOCAL_CACHE)
+class RejudgeTests(JudgeDirMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), "rejudge.json")
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.checkpoint))
+        patcher = mock.patch(
+            "linnncode.management.commands.rejudge.REJUDGE_CHECKPOINT", self.checkpoint
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        problem = benchmark.seed_problems([1])[0]
+        user = User.objects.create_user("rejudge")
+        self.submissions = [
+            Submission.objects.create(
+                code=benchmark.submission_code("pass"),
+                problem=problem,
+                user=user,
+                status=Submission.DONE,
+                success=False,
+            )
+            for _ in range(3)
+        ]
+
+    def rejudge(self):
+        out = io.StringIO()
+        call_command("rejudge", workers=1, stdout=out)
+        return out.getvalue()
+
+    def test_busy_submissions_are_skipped(self):
+        busy = self.submissions[1]
+        real_grade = judge.grade
+
+        def grade(submission, publish=None):
+            if submission.pk == busy.pk:
+                raise JudgeBusy(1)
+            return real_grade(submission, publish)
+
+        with mock.patch("linnncode.judge.grade", grade):
+            self.assertIn("skipped 1", self.rejudge())
+        with open(self.checkpoint) as file:
+            self.assertEqual(json.load(file)["skipped"], [busy.pk])
+        busy.refresh_from_db()
+        self.assertFalse(busy.success)
+        self.assertTrue(Submission.objects.get(pk=self.submissions[0].pk).success)
+
+        self.assertIn("Rejudged 1 submissions", self.rejudge())
+        busy.refresh_from_db()
+        self.assertTrue(busy.success)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+
+# small runs of the benchmark_judge load, a failure reports the numbers of the
+# run so a slower build or run shows up next to the test that measured it
+@override_settings(CACHES=LOCAL_CACHE)
+class JudgeBenchmarkTests(JudgeDirMixin, TransactionTestCase):
+    MIX = {"pass": 50, "fail": 30, "compile": 20}
+
+    def setUp(self):
+        super().setUp()
+        self.problems = benchmark.seed_problems([1, 10, 50])
+        self.user = User.objects.create_user("benchmark")
+
+    def run_benchmark(self, via, count, concurrency):
+        work = benchmark.plan(self.problems, count, self.MIX, seed=0)
+        samples, wall = benchmark.run_load(work, via, concurrency, self.user)
+        summary = benchmark.summarize(samples, wall)
+        numbers = f"{summary['throughput']:.2f}/s, " + ", ".join(
+            f"{stage} p50 {summary[stage][50] * 1000:.0f} ms "
+            f"p99 {summary[stage][99] * 1000:.0f} ms"
+            for stage in ("latency", "compile", "run")
+        )
+        self.assertEqual(summary["submissions"], count, numbers)
+        self.assertEqual(summary["mismatches"], 0, numbers)
+        self.assertGreater(summary["throughput"], 0, numbers)
+        for stage in ("latency", "compile", "run"):
+            values = summary[stage]
+            self.assertLessEqual(values[50], values[95], numbers)
+            self.assertLessEqual(values[95], values[99], numbers)
+        return summary
+
+    def test_driver_throughput(self):
+        self.run_benchmark("driver", 12, 4)
+
+    def test_view_throughput(self):
+        self.run_benchmark("view", 8, 2)
@@ -16,5 +16,23 @@ urlpatterns = [
         name="submissions",
     ),
     path("search-problem/", views.problem_search_view, name="problem_search"),
-    path("my-submissions/", views.my_submission_view, name="my_submissions")
+    path("my-submissions/", views.my_submission_view, name="my_submissions"),
+    path("leaderboard/", views.leaderboard_view, name="leaderboard"),
+    path(
+        "submissions/<int:submission_id>/code/",
+        views.submission_code_view,
+        name="submission_code",
+    ),
+    path(
+        "submissions/<int:submission_id>/status/",
+        views.submission_status_view,
+        name="submission_status",
+    ),
+    path(
+        "submissions/<int:submission_id>/stream/",
+        views.submission_stream_view,
+        name="submission_stream",
+    ),
+    path("judge/status/", views.judge_status_view, name="judge_status"),
+    path("metrics", views.metrics_view, name="metrics"),
 ]
@@ -1,90 +1,440 @@
 import subprocess
-import tempfile
 import os
-import shutil
-from functools import lru_cache
-from subprocess import TimeoutExpired
-from typing import Dict
-import re
-from .constants import MAX_CACHE_SIZE, EXECUTION_TIMEOUT
+import functools
+import hashlib
+import threading
+import signal
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+import json
+from .constants import (
+    EXECUTION_TIMEOUT,
+    COMPILE_TIMEOUT,
+    CPP_COMPILER,
+    CPP_FLAGS,
+    JUDGE_DIR,
+    PRELUDE_HEADER,
+    BINARY_CACHE_BYTES,
+    WORKSPACE_DIR,
+    CPP_MAIN,
+    CPU_TIME_LIMIT,
+    MEMORY_LIMIT,
+    OUTPUT_LIMIT,
+    ERROR_OUTPUT_LIMIT,
+)
+from .cache import BinaryCache
+from .limiter import judge_limiter
+from .limits import limited, resource, usage_of
+from .metrics import judge_metrics
+from .workspace import WorkspacePool
+
+
+# compiled binaries and deterministic results, shared by every worker on the host
+binary_cache = BinaryCache(os.path.join(JUDGE_DIR, "bin"), BINARY_CACHE_BYTES)
 
+# build directories reused across compiles instead of a new temporary one each time
+workspaces = WorkspacePool(WORKSPACE_DIR)
 
-@lru_cache(maxsize=MAX_CACHE_SIZE)
-def run_cpp(code):
-    # Create a temporary directory
-    temp_dir = tempfile.mkdtemp()
 
-    # Create a temporary file for the C++ code
-    code_file = os.path.join(temp_dir, "code.cpp")
+# the compiler failed rather than the submission, the outcome is never cached
+class CompilerFailure(Exception):
+    pass
 
-    with open(code_file, "w") as file:
-        file.write(code)
 
-    # Create a temporary file for the executable
-    exe_file = os.path.join(temp_dir, "code.exe")
+# g++ diagnostics that come from the judge host rather than the code
+HOST_ERRORS = ("No space left on device", "Cannot allocate memory", "Killed signal")
 
+
+# the cached binary, None for code that doesn't compile, CompilerFailure when
+# the build failed for any other reason
+def compile_cpp(code: str, key: str, harness: Optional[str] = None) -> Optional[str]:
     try:
-        # Compile the C++ code using g++
-        compile_result = subprocess.run(
-            ["g++", code_file, "-o", exe_file], capture_output=True, text=True
-        )
+        return build_binary(code, key, harness)
+    except OSError as e:
+        # no compiler, or a full or unwritable workspace or cache
+        raise CompilerFailure(str(e))
 
-        if compile_result.returncode == 0:
-            # Execution if compilation succeeds
-            result = None  # Initialize the result variable
 
-            try:
-                # Execute the compiled C++ code with a timeout
-                result = subprocess.run(
-                    [exe_file],
+def build_binary(code: str, key: str, harness: Optional[str] = None) -> Optional[str]:
+    with workspaces.checkout() as workspace:
+        # Compile the C++ code using g++, linking the prebuilt harness if there is one,
+        # the source goes in over stdin so it never touches the disk
+        objects = ["-x", "none", harness] if harness else []
+        try:
+            with judge_metrics.timer("compile"):
+                compile_result = subprocess.run(
+                    [
+                        CPP_COMPILER,
+                        *CPP_FLAGS,
+                        *["-x", "c++", "-"],
+                        *objects,
+                        *["-o", workspace.exe_file],
+                    ],
+                    input=code,
                     capture_output=True,
                     text=True,
-                    timeout=EXECUTION_TIMEOUT,
-                    check=True,
+                    timeout=COMPILE_TIMEOUT,
                 )
+        except subprocess.TimeoutExpired:
+            # holding a compile slot and the key's build lock, give both back
+            raise CompilerFailure(f"compiler timed out after {COMPILE_TIMEOUT}s")
+        if compile_result.returncode < 0:
+            # killed, e.g. by the OOM killer
+            raise CompilerFailure(f"compiler killed by signal {-compile_result.returncode}")
+        if compile_result.returncode != 0:
+            diagnostics = compile_result.stderr
+            if not diagnostics.strip() or any(e in diagnostics for e in HOST_ERRORS):
+                raise CompilerFailure(
+                    f"compiler failed with exit code {compile_result.returncode}"
+                )
+            return None
+        # keep the binary in the cache, the workspace is cleaned for the next build
+        with judge_metrics.timer("write"):
+            return binary_cache.put_binary(key, workspace.exe_file)
+
+
+def wait_with_usage(process: subprocess.Popen) -> Tuple[int, Optional[Dict]]:
+    # exit code plus the process's own CPU time and peak memory
+    if resource is None:
+        return process.wait(), None
+    _, status, rusage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, usage_of(rusage)
+
+
+def kill(process: subprocess.Popen) -> None:
+    # by pid, Popen.kill() polls and would reap the child before wait4 gets its
+    # rusage, an unreaped child's pid can't have been reused
+    if process.returncode is None:
+        try:
+            os.kill(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
 
-                # Return the output and error (if any)
-                return result.stdout, result.stderr
-
-            except TimeoutExpired:
-                # Execution exceeded the timeout
-                # Terminate the subprocess if it exists
-                if result is not None:
-                    subprocess.Popen.terminate(result)
-                return None, "Execution Timeout"
-
-            except subprocess.CalledProcessError as e:
-                if result is not None:
-                    subprocess.Popen.terminate(result)
-                return None, "CalledProcessError"
-            except Exception as e:
-                # Handle other exceptions that may occur during subprocess execution
-                if result is not None:
-                    subprocess.Popen.terminate(result)
-                return None, f"An error occurred: {e}"
-        else:
-            # Execution if compilation fails
-            error_message = compile_result.stderr
 
-            return None, "Compilation Error"
+def execute_cpp(
+    exe_file: str, on_line: Optional[Callable[[str], None]] = None
+) -> Tuple[Optional[str], str, Optional[Dict], bool]:
+    # returns output, error, resource usage and whether the outcome is the same
+    # on every run, stdout is split into lines as it arrives so on_line sees each
+    # test as soon as it finishes
+    # the limits are set by a wrapper that execs the binary, the wrapper would
+    # only report a missing binary as a failed run
+    if not os.path.exists(exe_file):
+        raise FileNotFoundError(exe_file)
+    try:
+        process = subprocess.Popen(
+            limited([exe_file], CPU_TIME_LIMIT, MEMORY_LIMIT, OUTPUT_LIMIT),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+    except FileNotFoundError:
+        # the binary was evicted by another worker, let the caller rebuild it
+        raise
+    except Exception as e:
+        # Handle other exceptions that may occur during subprocess execution
+        return None, f"An error occurred: {e}", None, False
+
+    # kill the binary once it runs past the timeout
+    timed_out = threading.Event()
+
+    def expire():
+        timed_out.set()
+        kill(process)
+
+    timer = threading.Timer(EXECUTION_TIMEOUT, expire)
+    timer.start()
+
+    # drain stderr on the side so a chatty binary can't block on a full pipe,
+    # only its start is kept
+    errors = bytearray()
+
+    def read_errors():
+        while True:
+            chunk = process.stderr.read1(65536)
+            if not chunk:
+                return
+            errors.extend(chunk[: ERROR_OUTPUT_LIMIT - len(errors)])
 
+    reader = threading.Thread(target=read_errors)
+    reader.start()
+
+    lines = []
+    pending = bytearray()
+    output_size = 0
+    output_exceeded = False
+    try:
+        # read in chunks and count bytes, a binary that never prints a newline
+        # is still capped, pipes aren't covered by RLIMIT_FSIZE
+        while True:
+            chunk = process.stdout.read1(65536)
+            if not chunk:
+                break
+            output_size += len(chunk)
+            if output_size > OUTPUT_LIMIT:
+                output_exceeded = True
+                kill(process)
+                break
+            pending.extend(chunk)
+            newline = chunk.rfind(b"\n")
+            if newline < 0:
+                continue
+            end = len(pending) - len(chunk) + newline
+            complete = pending[:end].split(b"\n")
+            del pending[: end + 1]
+            for line in complete:
+                line = line.decode(errors="replace") + "\n"
+                lines.append(line)
+                if on_line is not None:
+                    on_line(line)
+        if pending and not output_exceeded:
+            line = pending.decode(errors="replace")
+            lines.append(line)
+            if on_line is not None:
+                on_line(line)
+        returncode, usage = wait_with_usage(process)
+    except Exception as e:
+        kill(process)
+        process.wait()
+        return None, f"An error occurred: {e}", None, False
     finally:
-        # Remove the temporary directory and its contents
-        shutil.rmtree(temp_dir)
+        timer.cancel()
+        reader.join()
+        process.stdout.close()
+        process.stderr.close()
+
+    error = errors.decode(errors="replace")
+    if timed_out.is_set():
+        # Execution exceeded the timeout, may pass on a less loaded judge
+        return None, "Execution Timeout", usage, False
+    if output_exceeded:
+        return None, "Output Limit Exceeded", usage, True
+    if resource is not None and returncode == -signal.SIGXCPU:
+        return None, "CPU Time Limit Exceeded", usage, False
+    if returncode != 0 and "std::bad_alloc" in error:
+        # allocations fail once RLIMIT_AS is reached
+        return None, "Memory Limit Exceeded", usage, True
+    if returncode != 0:
+        return None, "CalledProcessError", usage, True
+    # Return the output and error (if any)
+    return "".join(lines), error, usage, True
+
+
+def run_cpp(
+    code: str,
+    version: str = "",
+    harness: Optional[str] = None,
+    on_line: Optional[Callable[[str], None]] = None,
+    timings: Optional[Dict[str, float]] = None,
+):
+    # timings, when given, gets the seconds spent compiling and running, both
+    # stay 0 when the result or the binary came from the cache
+    if timings is not None:
+        timings.update(compile=0.0, run=0.0)
+    # same source, flags, LTF version and harness always build the same binary,
+    # the source holds the suite's tests so a changed suite gets a new key. The
+    # limits are part of it too, a raised limit doesn't replay the verdicts of
+    # the old one
+    limits = (str(CPU_TIME_LIMIT), str(MEMORY_LIMIT), str(OUTPUT_LIMIT))
+    key = BinaryCache.key(
+        CPP_COMPILER, *CPP_FLAGS, *limits, version, harness or "", code
+    )
+    cached = replay_result(key, on_line)
+    if cached is not None:
+        return cached
+
+    # identical submissions judged at the same time wait for the first one
+    with binary_cache.lock(key):
+        cached = replay_result(key, on_line)
+        if cached is not None:
+            return cached
+        judge_metrics.count("linnncode_judge_cache_total", cache="result", result="miss")
+        if binary_cache.get_binary(key) is None:
+            return build_and_run(code, key, harness, on_line, timings)
+    # built by another run whose outcome can't be reused, run the binary again
+    return build_and_run(code, key, harness, on_line, timings)
+
+
+def replay_result(
+    key: str, on_line: Optional[Callable[[str], None]] = None
+) -> Optional[Tuple[Optional[str], str, Optional[Dict]]]:
+    cached = binary_cache.get_result(key)
+    if cached is not None:
+        judge_metrics.count("linnncode_judge_cache_total", cache="result", result="hit")
+        # replay a cached run to the listener as if it was streamed
+        output, error, usage = cached
+        if on_line is not None and output:
+            for line in output.splitlines(keepends=True):
+                on_line(line)
+    return cached
+
+
+def build_and_run(
+    code: str,
+    key: str,
+    harness: Optional[str] = None,
+    on_line: Optional[Callable[[str], None]] = None,
+    timings: Optional[Dict[str, float]] = None,
+):
+    if timings is None:
+        timings = {"compile": 0.0, "run": 0.0}
+    exe_file = binary_cache.get_binary(key)
+    judge_metrics.count(
+        "linnncode_judge_cache_total",
+        cache="binary",
+        result="miss" if exe_file is None else "hit",
+    )
+    for _ in range(2):
+        if exe_file is None:
+            with judge_limiter.compile_slot():
+                start = time.perf_counter()
+                try:
+                    exe_file = compile_cpp(code, key, harness)
+                except CompilerFailure as e:
+                    return None, f"Judge Error: {e}", None
+                finally:
+                    timings["compile"] += time.perf_counter() - start
+        if exe_file is None:
+            # Execution if compilation fails
+            with judge_metrics.timer("write"):
+                binary_cache.put_result(key, None, "Compilation Error")
+            return None, "Compilation Error", None
+        try:
+            with judge_limiter.run_slot():
+                start = time.perf_counter()
+                try:
+                    output, error, usage, deterministic = execute_cpp(
+                        exe_file, on_line
+                    )
+                finally:
+                    elapsed = time.perf_counter() - start
+                    timings["run"] += elapsed
+                    judge_metrics.observe("run", elapsed)
+            break
+        except FileNotFoundError:
+            exe_file = None
+    else:
+        return None, "An error occurred: binary disappeared from the cache", None
+
+    if deterministic:
+        with judge_metrics.timer("write"):
+            binary_cache.put_result(key, output, error, usage)
+    return output, error, usage
+
+
+def parse_cpp_record(line: str) -> Optional[Dict]:
+    # one test's record from LTF's JSON mode, anything else on stdout is skipped
+    if not line.startswith("{"):
+        return None
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(record, dict) or "name" not in record or "status" not in record:
+        return None
+    return record
+
+
+def match_cpp_records(input_str: str) -> Dict[str, Dict]:
+    # test name vs its record, name, status, ns, line and messages
+    records = {}
+    for line in input_str.splitlines():
+        record = parse_cpp_record(line)
+        if record is not None:
+            records[record["name"]] = record
+    return records
 
 
-@lru_cache(maxsize=MAX_CACHE_SIZE)
 def match_cpp_output(input_str: str) -> Dict:
-    # matching file output
-    pattern = r"TEST NAME:(\S+) ----> \[([A-Z]+)\]"
-    matches = re.findall(pattern, input_str)
+    # test name vs SUCCESS/FAIL
     results = {}
-    for match in matches:
-        test_name, status = match
-        results[test_name] = status
+    for test_name, record in match_cpp_records(input_str).items():
+        results[test_name] = record["status"]
     return results
 
 
+def compile_artifact(source: str, output: str, args: List[str]) -> bool:
+    # compile source into output once, other workers reuse the file afterwards
+    if os.path.exists(output):
+        return True
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    # build under temporary names so other workers, and other threads of this
+    # one, never see a half written file
+    directory = os.path.dirname(output)
+    fd, temp_source = tempfile.mkstemp(dir=directory, suffix=".src.tmp")
+    with os.fdopen(fd, "w") as file:
+        file.write(source)
+    fd, temp_output = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+
+    try:
+        compile_result = subprocess.run(
+            [CPP_COMPILER, *CPP_FLAGS, *args, temp_source, "-o", temp_output],
+            capture_output=True,
+            text=True,
+            timeout=COMPILE_TIMEOUT,
+        )
+        if compile_result.returncode != 0:
+            return False
+        os.replace(temp_output, output)
+        return True
+    except (OSError, subprocess.TimeoutExpired):
+        # no compiler, unwritable directory or a hung build, callers fall back
+        # to inlining
+        return False
+    finally:
+        for temp in (temp_source, temp_output):
+            if os.path.exists(temp):
+                os.remove(temp)
+
+
+def build_pch(prelude: str) -> Optional[str]:
+    # one directory per prelude + flags, so a changed LTF.h gets a fresh header
+    key = "\n".join([CPP_COMPILER, *CPP_FLAGS, prelude])
+    version = hashlib.sha256(key.encode()).hexdigest()[:16]
+    header = os.path.join(JUDGE_DIR, "pch", version, PRELUDE_HEADER)
+    if os.path.exists(header + ".gch"):
+        return header
+
+    # the header has to sit next to its .gch for g++ to pick the .gch up,
+    # it is written first so a .gch never exists without its header
+    os.makedirs(os.path.dirname(header), exist_ok=True)
+    fd, temp_header = tempfile.mkstemp(dir=os.path.dirname(header), suffix=".tmp")
+    with os.fdopen(fd, "w") as file:
+        file.write(prelude)
+    os.replace(temp_header, header)
+    if not compile_artifact(prelude, header + ".gch", ["-x", "c++-header"]):
+        return None
+    return header
+
+
+def build_harness(ltf: str, registration_count: int) -> Optional[str]:
+    # LTF itself, the registrations of test1..N and main don't depend on the
+    # user's code, so they are compiled once per suite size and linked in
+    key = "\n".join([CPP_COMPILER, *CPP_FLAGS, ltf, CPP_MAIN, str(registration_count)])
+    version = hashlib.sha256(key.encode()).hexdigest()[:16]
+    harness = os.path.join(JUDGE_DIR, "harness", f"harness_{version}.o")
+    source = ltf + "\n"
+    # the tests are defined in the user's translation unit
+    source += build_declarations(registration_count) + "\n"
+    source += build_registration(registration_count) + "\n"
+    source += CPP_MAIN + "\n"
+    if not compile_artifact(source, harness, ["-x", "c++", "-c"]):
+        return None
+    return harness
+
+
+def build_declarations(count: int) -> str:
+    template = "LTF::LTFStatus test<NUMBER>(bool debug);"
+    number = "<NUMBER>"
+    declarations = ""
+    for i in range(1, count + 1):
+        declarations += template.replace(number, str(i)) + "\n"
+    return declarations
+
+
+@functools.lru_cache(maxsize=None)
 def build_registration(count:int)->str:
 
     template = "LTF_TEST(MAIN, test<NUMBER>);"
@@ -1,13 +1,42 @@
-from django.shortcuts import render, redirect
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from datetime import datetime
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse, Http404
+from django.urls import reverse
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.db import IntegrityError
 from django.contrib import messages
-from .models import Problem, Submission
-from django.core.paginator import Paginator
+from .models import Problem, SolvedProblem, Submission, TestCase, UserStats
+from django.core.cache import cache
+from django.db.models import F
+from django.core.paginator import Page, Paginator
 from .forms import CodeForm
-from .driver import TestBuilder, TestDriver
+from .driver import TestBuilder
+from .judge import judge, queue_length
+from .search import search_problems
+from .limiter import JudgeBusy, retry_after
+from .metrics import judge_metrics
+from .constants import (
+    JUDGE_ASYNC,
+    JUDGE_MAX_QUEUE,
+    COMPILE_SLOTS,
+    RUN_SLOTS,
+    STATUS_POLL_INTERVAL,
+    STREAM_POLL_INTERVAL,
+    STREAM_MAX_SECONDS,
+    PROBLEM_LIST_GENERATION,
+    PROBLEM_LIST_CACHE_SECONDS,
+    SUBMISSION_TOTAL_CACHE_SECONDS,
+    LEADERBOARD_PAGE_SIZE,
+    LEADERBOARD_CACHE_SECONDS,
+)
 
 
 def home_view(request):
@@ -17,9 +46,6 @@ def home_view(request):
 # Create your views here.
 def login_view(request):
     if request.user.is_authenticated:
-        request.session.set_expiry(
-            900
-        )  # Reset session expiry to 15 minutes (900 seconds)
         return redirect("home")
     if request.method == "POST":
         username = request.POST.get("username")
@@ -28,9 +54,6 @@ def login_view(request):
         # login if authenticate success
         if user is not None:
             login(request, user)
-            request.session.set_expiry(
-                900
-            )  # Set session expiry to 15 minutes (900 seconds)
             return redirect("home")
         else:
             message = "Incorrect Username or Password Entered"
@@ -42,9 +65,6 @@ def login_view(request):
 
 def register_view(request):
     if request.user.is_authenticated:
-        request.session.set_expiry(
-            900
-        )  # Reset session expiry to 15 minutes (900 seconds)
         return redirect("home")
     if request.method == "POST":
         username = request.POST.get("username")
@@ -56,9 +76,6 @@ def register_view(request):
                 username=username, password=password, email=email
             )
             login(request, user)
-            request.session.set_expiry(
-                900
-            )  # Set session expiry to 15 minutes (900 seconds)
             return redirect("home")
         except IntegrityError:
             messages.error(request, "Username Already Exists")
@@ -73,26 +90,88 @@ def logout_view(request):
     return redirect("login")
 
 
-def problem_view(request):
-    request.session.set_expiry(900)
-    problems_list = Problem.objects.all().order_by("id")
+# what a problem card shows, the statistics come joined in with the title
+def problem_cards(problems):
+    return problems.values(
+        "id",
+        "title",
+        total_submissions=F("stats__submissions"),
+        accepted=F("stats__accepted"),
+        solvers=F("stats__solvers"),
+    )
+
+
+# the page asked for as a number, anything that isn't one is the first page like
+# Paginator.get_page has it, so junk in ?page= can't make cache keys of its own
+def page_number_of(value):
+    try:
+        return max(int(value), 1)
+    except (TypeError, ValueError):
+        return 1
+
 
-    paginator = Paginator(problems_list, 5)  # Show 5 problems per page.
-    page_number = request.GET.get("page")
-    problems = paginator.get_page(page_number)
+# one page of problem cards, only the columns the list shows, cached for a while
+# or until a problem changes so the list and its count aren't queried on every hit,
+# with a query the problems come ranked from the full text search
+def problem_page(page_number, query=""):
+    page_number = page_number_of(page_number)
+    generation = cache.get_or_set(PROBLEM_LIST_GENERATION, 0, None)
+    digest = hashlib.md5(query.encode()).hexdigest()
+    key = f"linnncode:problems:{generation}:{digest}:"
+    cached = cache.get(f"{key}{page_number}")
+    if cached is None:
+        if query:
+            paginator = Paginator(search_problems(query), 5)
+            page = paginator.get_page(page_number)
+            cards = problem_cards(Problem.objects.filter(id__in=page.object_list))
+            cards = {card["id"]: card for card in cards}
+            rows = [cards[pk] for pk in page.object_list if pk in cards]
+        else:
+            problems_list = Problem.objects.all().order_by("id")
+            paginator = Paginator(problem_cards(problems_list), 5)
+            page = paginator.get_page(page_number)
+            rows = list(page.object_list)
+        cached = (rows, page.number, paginator.count)
+        # a page past the last one is served the last page, kept under its number
+        cache.set(f"{key}{page.number}", cached, PROBLEM_LIST_CACHE_SECONDS)
+
+    rows, number, count = cached
+    paginator = Paginator([], 5)  # Show 5 problems per page.
+    paginator.count = count
+    return Page(rows, number, paginator)
 
-    context = {"problems": problems}
+
+def problem_view(request):
+    problems = problem_page(request.GET.get("page"))
+
+    context = {"problems": problems, "solved": solved_ids(request.user, problems)}
     return render(request, "problem.html", context)
 
 
+# which of the listed problems the user has solved, for marking them
+def solved_ids(user, problems):
+    if not user.is_authenticated:
+        return set()
+    ids = [problem["id"] for problem in problems]
+    solved = SolvedProblem.objects.filter(user=user, problem_id__in=ids)
+    return set(solved.values_list("problem_id", flat=True))
+
+
+# name, status and run time of each test, for showing a verdict
+def test_rows(results, details):
+    rows = []
+    for name, status in (results or {}).items():
+        ns = ((details or {}).get(name) or {}).get("ns")
+        rows.append({"name": name, "status": status, "ns": ns})
+    return rows
+
+
 @login_required(login_url="login")
 def problem_detail_view(request, problem_id):
-    request.session.set_expiry(900)
     problem = Problem.objects.get(id=problem_id)
-    output = None
-    err = None
-    results = None
-    flag = False
+    submission = None
+    busy = None
+    rejected = None
 
     if request.method == "POST":
         form = CodeForm(request.POST)
@@ -102,93 +181,334 @@ def problem_detail_view(request, problem_id):
             # get the language
             language = request.POST.get("language", "cpp")
 
-            # build the test output based on laguage
-            test_builder = TestBuilder(language)
-
-            ## for C++ Only
-            if language == "cpp":
-                # get all the test cases
-                cases = problem.test_suite.test_cases.all()
-                # get the registration
-                registration_count = len(cases)
-                cases_list = []
-                # extract the strings of test cases
-                for case in cases:
-                    cases_list.append(case.test_case)
-                # pass in list of tests and main, and code, and registration
-                test_builder.setup_cpp(cases_list, code, registration_count)
-                # build the file and put it into driver
-                test_exe = TestDriver(test_builder.build())
-                output, err = test_exe.execute_cpp()
-
-                # handling output
-                if err:
-                    messages.error(request, err)
-                    output = None
-                else:
-                    # decide which one is correct which one is wrong
-                    results = TestDriver.extract_cpp_output(output)
-                    # no fail, then success
-                    if "FAIL" not in results.values():
-                        flag = True
-
-                ## either error or not, create submission to the problem
+            waiting = queue_length()
+            if language not in dict(TestCase.LANGUAGE_CHOICES):
+                # no judge runs it, it would stay pending forever
+                rejected = "Unsupported Language"
+            elif not TestBuilder.get_tests(problem.test_suite, language)[1]:
+                # nothing to fail, it would be accepted without being tested
+                rejected = "No Tests For This Language"
+            elif JUDGE_ASYNC and waiting >= JUDGE_MAX_QUEUE:
+                # turn the submission away when the judge is already backed up
+                busy = JudgeBusy(retry_after(waiting))
+            else:
+                ## create the submission as pending, a judge worker grades it
                 submission = Submission.objects.create(
-                    code=code, problem=problem, user=request.user, success=flag
+                    code=code,
+                    problem=problem,
+                    user=request.user,
+                    language=language,
+                    status=Submission.PENDING,
                 )
-                submission.save()
-            if language == "python":
-                pass
+                if not JUDGE_ASYNC:
+                    try:
+                        judge(submission)
+                    except JudgeBusy as e:
+                        # judged inline, there is no worker to pick it up later
+                        submission.delete()
+                        submission = None
+                        busy = e
+                if submission is not None:
+                    # the page then polls the judge for this submission
+                    url = reverse("problem_detail", args=[problem.id])
+                    return redirect(f"{url}?submission={submission.id}")
     else:
-        form = CodeForm(initial={"code": problem.prewritten_code})
+        # showing a submission that was just made
+        submission_id = request.GET.get("submission", "")
+        if submission_id.isdigit():
+            submission = (
+                Submission.objects.select_related("blob")
+                .filter(id=submission_id, user=request.user, problem=problem)
+                .first()
+            )
+        code = submission.code if submission else problem.prewritten_code
+        form = CodeForm(initial={"code": code})
 
+    done = submission is not None and submission.status == Submission.DONE
+    error = submission.error if done else None
+    results = submission.results if done else None
+    if busy is not None:
+        error = str(busy)
+    if rejected is not None:
+        error = rejected
     context = {
         "problem": problem,
         "form": form,
-        "error": err,
+        "submission": submission,
+        "error": error,
         "results": results,
+        "tests": test_rows(results, submission.details if done else None),
+        "poll_interval": STATUS_POLL_INTERVAL,
+    }
+    response = render(request, "problem_detail.html", context)
+    if rejected is not None:
+        response.status_code = 400
+    if busy is not None:
+        response.status_code = 503
+        response["Retry-After"] = str(busy.retry_after)
+    return response
+
+
+@login_required(login_url="login")
+def submission_status_view(request, submission_id):
+    submission = get_object_or_404(Submission, id=submission_id, user=request.user)
+    status = {
+        "id": submission.id,
+        "status": submission.status,
+        "success": submission.success,
+        "error": submission.error,
+        "results": submission.results,
+        "details": submission.details,
+        "cpu_time": submission.cpu_time,
+        "memory": submission.memory,
+    }
+    if submission.status == Submission.PENDING:
+        # how many submissions will be judged before this one
+        ahead = Submission.objects.filter(status=Submission.PENDING, id__lt=submission.id)
+        status["queue_position"] = ahead.count() + 1
+    return JsonResponse(status)
+
+
+def server_sent_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# pushes each test's verdict to the problem page as the judge reports it,
+# needs an ASGI server (mysite.asgi) to stream instead of buffering
+async def submission_stream_view(request, submission_id):
+    user = await sync_to_async(
+        lambda: request.user if request.user.is_authenticated else None
+    )()
+    submissions = Submission.objects.filter(id=submission_id, user=user)
+    if user is None or not await submissions.aexists():
+        raise Http404("Submission does not exist")
+
+    async def events():
+        sent = set()
+        status = None
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        while True:
+            submission = await submissions.values(
+                "status", "success", "error", "results", "details"
+            ).aget()
+            if submission["status"] != status:
+                status = submission["status"]
+                yield server_sent_event("status", {"status": status})
+            for test in test_rows(submission["results"], submission["details"]):
+                if test["name"] not in sent:
+                    sent.add(test["name"])
+                    yield server_sent_event("result", test)
+            if status == Submission.DONE:
+                yield server_sent_event("done", submission)
+                return
+            if time.monotonic() > deadline:
+                # e.g. no judge worker is running, the page polls from here on
+                yield server_sent_event("expired", {"status": status})
+                return
+            await asyncio.sleep(STREAM_POLL_INTERVAL)
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # stop proxies from holding the events back
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+# queue length and capacity, for operators sizing the judge
+def judge_status_view(request):
+    waiting = queue_length()
+    status = {
+        "pending": waiting,
+        "running": Submission.objects.filter(status=Submission.RUNNING).count(),
+        "max_queue": JUDGE_MAX_QUEUE,
+        "compile_slots": COMPILE_SLOTS,
+        "run_slots": RUN_SLOTS,
+        "retry_after": retry_after(waiting),
+    }
+    return JsonResponse(status)
+
+
+# judge metrics of every worker on this host, for Prometheus to scrape
+def metrics_view(request):
+    gauges = {
+        "linnncode_judge_queue_depth": queue_length(),
+        "linnncode_judge_running": Submission.objects.filter(
+            status=Submission.RUNNING
+        ).count(),
     }
-    return render(request, "problem_detail.html", context)
+    return HttpResponse(
+        judge_metrics.render(gauges),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+# the columns a submissions page shows, user and problem joined in and the code
+# left out, it's fetched from submission_code_view when its modal opens
+def submission_rows(submissions):
+    return (
+        submissions.select_related("user", "problem")
+        .only(
+            "id",
+            "date",
+            "success",
+            "cpu_time",
+            "memory",
+            "user__username",
+            "problem__title",
+        )
+        .order_by("-date", "-id")
+    )
+
+
+# position of a submission in the newest first history, as a token for page links
+def submission_cursor(submission) -> str:
+    value = f"{submission.date.isoformat()}|{submission.id}"
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def parse_cursor(token):
+    try:
+        date, pk = base64.urlsafe_b64decode(token.encode()).decode().split("|")
+        return datetime.fromisoformat(date), int(pk)
+    except ValueError:
+        return None
+
+
+# the page of submissions right after or right before a cursor, found through the
+# (date, id) index so a deep page costs the same as the first one
+def submission_page(submissions, after=None, before=None, per_page=11):
+    after = parse_cursor(after) if after else None
+    before = parse_cursor(before) if before else None
+    if before is not None:
+        date, pk = before
+        newer = submissions.filter(date__gte=date).exclude(date=date, id__lte=pk)
+        rows = list(newer.order_by("date", "id")[: per_page + 1])
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_next = True
+    else:
+        if after is not None:
+            date, pk = after
+            submissions = submissions.filter(date__lte=date).exclude(
+                date=date, id__gte=pk
+            )
+        rows = list(submissions[: per_page + 1])
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_previous = after is not None
+    return {
+        "submissions": rows,
+        "next_cursor": submission_cursor(rows[-1]) if has_next and rows else None,
+        "previous_cursor": submission_cursor(rows[0]) if has_previous and rows else None,
+    }
+
+
+# a recent count of the submissions instead of counting them on every page
+def approximate_total(key, submissions):
+    if SUBMISSION_TOTAL_CACHE_SECONDS is None:
+        return None
+    key = f"linnncode:submissions:total:{key}"
+    return cache.get_or_set(key, submissions.count, SUBMISSION_TOTAL_CACHE_SECONDS)
+
+
+@login_required(login_url="login")
+def submission_code_view(request, submission_id):
+    submission = get_object_or_404(
+        Submission.objects.select_related("blob").only("id", "blob"), id=submission_id
+    )
+    return JsonResponse({"id": submission_id, "code": submission.code})
 
 
 @login_required(login_url="login")
 def submission_view(request, problem_id):
-    request.session.set_expiry(900)
-    problem = Problem.objects.get(id=problem_id)
+    problem = Problem.objects.only("id", "title").get(id=problem_id)
 
-    submissions_list = problem.submissions.all().order_by("-date")
-    paginator = Paginator(submissions_list, 11)
-    page_number = request.GET.get("page")
-    submissions = paginator.get_page(page_number)
-    context = {"submissions": submissions, "title": problem.title, "problem": problem}
+    submissions_list = submission_rows(problem.submissions.all())
+    context = submission_page(
+        submissions_list, request.GET.get("after"), request.GET.get("before")
+    )
+    context["total"] = approximate_total(f"problem:{problem.id}", submissions_list)
+    context["title"] = problem.title
+    context["problem"] = problem
     return render(request, "submissions.html", context)
 
 
 def problem_search_view(request):
-    request.session.set_expiry(900)  # Reset session expiry to 15 minutes (900 seconds)
     query = request.GET.get("query")
     if not query:
         return redirect("problems")
 
-    problem_list = Problem.objects.filter(title__startswith=query).order_by("id")
-    paginator = Paginator(problem_list, 5)  # Show 5 problems per page.
-    page_number = request.GET.get("page")
-    problems = paginator.get_page(page_number)
+    problems = problem_page(request.GET.get("page"), query)
 
-    context = {"problems": problems}
+    context = {"problems": problems, "solved": solved_ids(request.user, problems)}
     return render(request, "problem.html", context)
 
 
+# one page of users by problems solved, with their competition rank, ties share
+# a rank, cached for a short while since every verdict can move it
+def leaderboard_page(page_number):
+    page_number = page_number_of(page_number)
+    key = "linnncode:leaderboard:"
+    cached = cache.get(f"{key}{page_number}")
+    if cached is None:
+        ranked = (
+            UserStats.objects.filter(solved__gt=0)
+            .order_by("-solved", "submissions", "user_id")
+            .values("user__username", "solved", "submissions")
+        )
+        paginator = Paginator(ranked, LEADERBOARD_PAGE_SIZE)
+        page = paginator.get_page(page_number)
+        rows = list(page.object_list)
+        offset = page.start_index() - 1
+        for i, row in enumerate(rows):
+            if i == 0:
+                # users on earlier pages may share the first row's rank
+                better = UserStats.objects.filter(solved__gt=row["solved"])
+                row["rank"] = 1 + better.count()
+            elif row["solved"] == rows[i - 1]["solved"]:
+                row["rank"] = rows[i - 1]["rank"]
+            else:
+                row["rank"] = offset + i + 1
+        cached = (rows, page.number, paginator.count)
+        cache.set(f"{key}{page.number}", cached, LEADERBOARD_CACHE_SECONDS)
+
+    rows, number, count = cached
+    paginator = Paginator([], LEADERBOARD_PAGE_SIZE)
+    paginator.count = count
+    return Page(rows, number, paginator)
+
+
+def user_rank(user):
+    if not user.is_authenticated:
+        return None
+    key = f"linnncode:leaderboard:rank:{user.id}"
+
+    def rank():
+        solved = UserStats.objects.filter(user=user).values_list("solved", flat=True)
+        solved = solved.first() or 0
+        if not solved:
+            return None
+        return {
+            "rank": 1 + UserStats.objects.filter(solved__gt=solved).count(),
+            "solved": solved,
+        }
+
+    return cache.get_or_set(key, rank, LEADERBOARD_CACHE_SECONDS)
+
+
+def leaderboard_view(request):
+    leaders = leaderboard_page(request.GET.get("page"))
+    context = {"leaders": leaders, "my_rank": user_rank(request.user)}
+    return render(request, "leaderboard.html", context)
+
+
 @login_required(login_url="login")
 def my_submission_view(request):
-    request.session.set_expiry(900)
-    submissions_list = Submission.objects.filter(user=request.user).order_by("-date")
-    paginator = Paginator(submissions_list, 11)
-    page_number = request.GET.get("page")
-    submissions = paginator.get_page(page_number)
-    context = {
-        "submissions": submissions,
-        "title": f"All Submissions Submitted By {request.user}",
-        "problem": None,
-    }
+    submissions_list = submission_rows(Submission.objects.filter(user=request.user))
+    context = submission_page(
+        submissions_list, request.GET.get("after"), request.GET.get("before")
+    )
+    context["total"] = approximate_total(f"user:{request.user.id}", submissions_list)
+    context["title"] = f"All Submissions Submitted By {request.user}"
+    context["problem"] = None
     return render(request, "submissions.html", context)
@@ -0,0 +1,71 @@
+import os
+import queue
+import shutil
+import threading
+from contextlib import contextmanager
+
+
+# a build directory with a fixed layout, reused from one compile to the next
+class Workspace:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.exe_file = os.path.join(path, "code.exe")
+        os.makedirs(path, exist_ok=True)
+
+    def clean(self) -> None:
+        for entry in os.scandir(self.path):
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
+
+
+# workspaces are created once per process and checked out for each build,
+# instead of a fresh temporary directory made and removed on every run
+class WorkspacePool:
+    def __init__(self, root: str) -> None:
+        self._root = root
+        self._lock = threading.Lock()
+        self._pid = None
+        self._idle = None
+        self._count = 0
+
+    def _reset(self) -> None:
+        # a forked judge worker must not share its parent's directories
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._count = 0
+        self._remove_orphans()
+
+    def _remove_orphans(self) -> None:
+        # workspaces of processes that are gone, e.g. after a crash
+        if not os.path.isdir(self._root):
+            return
+        for entry in os.scandir(self._root):
+            pid = entry.name.split("-")[0]
+            if not pid.isdigit() or int(pid) == self._pid:
+                continue
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                shutil.rmtree(entry.path, ignore_errors=True)
+            except PermissionError:
+                pass
+
+    @contextmanager
+    def checkout(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            try:
+                workspace = self._idle.get_nowait()
+            except queue.Empty:
+                self._count += 1
+                name = f"{self._pid}-{self._count}"
+                workspace = Workspace(os.path.join(self._root, name))
+            idle = self._idle
+        try:
+            yield workspace
+        finally:
+            workspace.clean()
+            idle.put(workspace)
@@ -3,6 +3,9 @@ ASGI config for mysite project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the site through it (e.g. uvicorn mysite.asgi:application) for the
+submission event streams to reach the problem page as tests finish.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 """
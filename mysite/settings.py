@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -46,6 +47,8 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "linnncode.middleware.ProfilingMiddleware",
+    "linnncode.middleware.SlidingSessionMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -80,9 +83,34 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": os.path.join(BASE_DIR, "db.sqlite3"),
+        # a file rather than SQLite's in-memory database, so the threads of the
+        # judge tests each get their own connection and wait on locks instead
+        # of failing with "database table is locked"
+        "TEST": {"NAME": os.path.join(tempfile.gettempdir(), "linnncode_test.sqlite3")},
     }
 }
 
+# Cache shared by the web and judge processes, holds e.g. assembled test suites
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(tempfile.gettempdir(), "linnncode", "django_cache"),
+        # room for cached sessions next to the pages and test suites
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+
+
+# Sessions, logged in users are signed out after SESSION_COOKIE_AGE without a
+# request, a session is only saved again once half of it has passed. The engine
+# can be switched to "django.contrib.sessions.backends.cache" or
+# "django.contrib.sessions.backends.signed_cookies" to keep sessions out of the
+# database entirely
+SESSION_ENGINE = os.environ.get(
+    "SESSION_ENGINE", "django.contrib.sessions.backends.cached_db"
+)
+SESSION_COOKIE_AGE = 30 * 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators